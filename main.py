@@ -1,9 +1,10 @@
 """Example LangChain server exposes and agent that has conversation history.
 
-In this example, the history is stored entirely on the client's side.
+The agent is served twice:
 
-Please see other examples in LangServe on how to use RunnableWithHistory to
-store history on the server side.
+* ``/`` is stateless and the client sends the whole ``chat_history`` every time.
+* ``/chat`` keeps the history on the server. Clients send only the new ``input`` and a
+  ``session_id`` in ``config["configurable"]``. See server/sessions.py.
 
 Relevant LangChain documentation:
 
@@ -15,38 +16,58 @@ Relevant LangChain documentation:
 **ATTENTION**
 1. To support streaming individual tokens you will need to use the astream events
    endpoint rather than the streaming endpoint.
-2. This example does not truncate message history, so it will crash if you
-   send too many messages (exceed token length).
+2. Message history is trimmed to a token budget; older turns are replaced by a
+   rolling summary (see server/history.py).
 3. The playground at the moment does not render agent output well! If you want to
    use the playground you need to customize it's output server side using astream
    events by wrapping it within another runnable.
 4. See the client notebook it has an example of how to use stream_events client side!
 """  # noqa: E501
+import time
+
+_import_started = time.perf_counter()
+
+import logging
+import os
+from functools import lru_cache
 from dotenv import load_dotenv
 from typing import Any, List, Union
 
 from fastapi import FastAPI
-from langchain.agents import AgentExecutor, tool
-from langchain.agents.format_scratchpad.openai_tools import (
-    format_to_openai_tool_messages,
-)
-from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
-from langchain.prompts import MessagesPlaceholder
-from langchain_community.tools.convert_to_openai import format_tool_to_openai_tool
 from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from reactors.pfr.tools import PlugFlowConversionTool
-from reactors.pfr.molar_expansion import pfr_expansion_factor
-from reactors.pfr.tools import PlugFlowVolumeConversionTool
-from scipy.optimize import fsolve
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.history import RunnableWithMessageHistory
+from langchain_core.tools import tool
+from reactors.budget import DidNotConverge
+from reactors.pfr.checkpoints import CheckpointStore
+from reactors.pfr.molar_expansion import pfr_conversion as pfr_conversion_result
+from reactors.pfr.molar_expansion import pfr_expansion_volume_conversion as pfr_volume_conversion_result
+from reactors.pfr.molar_expansion import pfr_expansion_factor, set_checkpoint_store, set_result_cache
+from reactors.pfr.results import PFRResult
+from server.admission import AdmissionMiddleware, ComputeQueue, ComputeQueueFull
+from server.history import HistoryTrimmer
+from server.pfr_routes import pfr_router
+from server.prerouter import PreRouter
+from server.response_cache import ResponseCache
+from server.result_cache import result_cache_from_env
+from server.sessions import session_store_from_env
 
 from fastapi.middleware.cors import CORSMiddleware
 
 from langserve import add_routes
 from langserve.pydantic_v1 import BaseModel, Field
 
+# LangChain's agent machinery, langchain_openai and SciPy are only imported when the
+# agent or a solver is first used, which keeps worker start-up fast. Set
+# ALCHEMY_PRELOAD=1 to load them at import instead, e.g. in a server that imports the
+# app before forking its workers, such as gunicorn --preload.
+PRELOAD = os.getenv("ALCHEMY_PRELOAD", "").lower() in ("1", "true", "yes")
 
+logger = logging.getLogger(__name__)
+
+# Seconds spent in each start-up phase, served at /startup
+startup_timings = {}
 
 load_dotenv()
 
@@ -73,6 +94,19 @@ prompt = ChatPromptTemplate.from_messages(
 )
 
 
+# Solver calls from the tools go through a bounded pool with a per-solve time and
+# step budget. A solve that runs out of budget, or finds the pool saturated, returns a
+# "did not converge" result to the agent instead of tying up the server.
+compute_queue = ComputeQueue()
+
+# Solver results are cached in a table shared by all workers on this host, see
+# server/result_cache.py. ALCHEMY_RESULT_CACHE=local keeps a cache per worker instead.
+set_result_cache(result_cache_from_env())
+# Volume searches and repeated volumes of one feed continue from the furthest solved
+# point instead of integrating from the inlet again, see reactors/pfr/checkpoints.py.
+set_checkpoint_store(CheckpointStore())
+
+
 @tool
 def word_length(word: str) -> int:
     """Returns a counter word"""
@@ -94,19 +128,13 @@ def pfr_conversion(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d):
     - c: The stoichiometric coefficient of reactant C
     - d: The stoichiometric coefficient of reactant D
 
-    Returns the conversion"""
-    conv, prod = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d)
-    # plug_flow_conversion_dict = {
-    #     "initial_volumetric_flowrate": v_0,
-    #     "temperature": T,
-    #     "initial_pressure": P_0,
-    #     "initial_concentration_of_A": c_A0,
-    #     "initial_concentration_of_B": c_B0,
-    #     "rate_constant": k,
-    #     "reactor_volume": V,
-    #     "conversion": conv,
-    # }
-    return float(conv)
+    Returns the conversion, with the inputs, as a PFR result"""
+    try:
+        result = compute_queue.run(pfr_conversion_result, v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d)
+    # A solve that times out in the queue raises instead of returning a failed result
+    except (DidNotConverge, ComputeQueueFull) as exc:
+        result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, reactor_volume=V).did_not_converge(exc)
+    return result.to_dict()
 
 @tool
 def pfr_expansion_volume_conversion(v_0, T, P_0, c_A0, c_B0, k, X, a, b, c, d):
@@ -128,73 +156,94 @@ def pfr_expansion_volume_conversion(v_0, T, P_0, c_A0, c_B0, k, X, a, b, c, d):
     - d: The stoichiometric coefficient of reactant D
 
     Returns:
-    - V: Reactor volume that achieves the target conversion
+    - V: Reactor volume that achieves the target conversion, with the inputs, as a PFR result
     """
-    def objective(V):
-        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d)
-        return conv_calc - X
-
-    v_solve = fsolve(objective, 1)[0]
-    # plug_flow_conversion_dict = {
-    #     "initial_volumetric_flowrate": v_0,
-    #     "temperature": T,
-    #     "initial_pressure": P_0,
-    #     "initial_concentration_of_A": c_A0,
-    #     "initial_concentration_of_B": c_B0,
-    #     "rate_constant": k,
-    #     "reactor_volume": v_solve,
-    #     "conversion": X,
-    # }
-    return v_solve
-
-# We need to set streaming=True on the LLM to support streaming individual tokens.
-# Tokens will be available when using the stream_log / stream events endpoints,
-# but not when using the stream endpoint since the stream implementation for agent
-# streams action observation pairs not individual tokens.
-# See the client notebook that shows how to use the stream events endpoint.
-llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, streaming=True)
+    try:
+        result = compute_queue.run(pfr_volume_conversion_result, v_0, T, P_0, c_A0, c_B0, k, X, a, b, c, d)
+    except (DidNotConverge, ComputeQueueFull) as exc:
+        result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, conversion=X).did_not_converge(exc)
+    return result.to_dict()
+
 
 tools = [pfr_conversion, pfr_expansion_volume_conversion]
 
 
-llm_with_tools = llm.bind(tools=[format_tool_to_openai_tool(tool) for tool in tools])
-
-# ATTENTION: For production use case, it's a good idea to trim the prompt to avoid
-#            exceeding the context window length used by the model.
-#
-# To fix that simply adjust the chain to trim the prompt in whatever way
-# is appropriate for your use case.
-# For example, you may want to keep the system message and the last 10 messages.
-# Or you may want to trim based on the number of tokens.
-# Or you may want to also summarize the messages to keep information about things
-# that were learned about the user.
-#
-# def prompt_trimmer(messages: List[Union[HumanMessage, AIMessage, FunctionMessage]]):
-#     '''Trims the prompt to a reasonable length.'''
-#     # Keep in mind that when trimming you may want to keep the system message!
-#     return messages[-10:] # Keep last 10 messages.
-
-# def custom_output_parser():
-#     # Extract the relevant output from the agent's response
-#     # Assuming the conversion result is directly the output of the tool
-#     output = OpenAIToolsAgentOutputParser()
-#     content = output["messages"][0]["content"]
-#     return content
-
-agent = (
-    {
-        "input": lambda x: x["input"],
-        "agent_scratchpad": lambda x: format_to_openai_tool_messages(
-            x["intermediate_steps"]
-        ),
-        "chat_history": lambda x: x["chat_history"],
-    }
-    | prompt
-    # | prompt_trimmer # See comment above.
-    | llm_with_tools
-    | OpenAIToolsAgentOutputParser()
-)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+@lru_cache(maxsize=None)
+def get_openai_tools():
+    """The OpenAI tool schemas, generated once."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
+    return [convert_to_openai_tool(tool) for tool in tools]
+
+
+@lru_cache(maxsize=None)
+def get_history_trimmer():
+    """
+    Keep the prompt within the model's context window. Recent turns are passed through
+    verbatim and older ones, tool results included, are folded into a cached rolling
+    summary. The summarizer does not stream so its tokens never show up in stream_events.
+    """
+    from langchain_openai import ChatOpenAI
+
+    return HistoryTrimmer(ChatOpenAI(model="gpt-3.5-turbo", temperature=0))
+
+
+@lru_cache(maxsize=None)
+def get_agent_executor():
+    """Build the agent on first use."""
+    started = time.perf_counter()
+    from langchain.agents import AgentExecutor
+    from langchain.agents.format_scratchpad.openai_tools import (
+        format_to_openai_tool_messages,
+    )
+    from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
+    from langchain_openai import ChatOpenAI
+
+    # We need to set streaming=True on the LLM to support streaming individual tokens.
+    # Tokens will be available when using the stream_log / stream events endpoints,
+    # but not when using the stream endpoint since the stream implementation for agent
+    # streams action observation pairs not individual tokens.
+    # See the client notebook that shows how to use the stream events endpoint.
+    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, streaming=True)
+
+    llm_with_tools = llm.bind(tools=get_openai_tools())
+    history_trimmer = get_history_trimmer()
+
+    agent = (
+        {
+            "input": lambda x: x["input"],
+            "agent_scratchpad": lambda x: format_to_openai_tool_messages(
+                x["intermediate_steps"]
+            ),
+            "chat_history": lambda x: history_trimmer(x["chat_history"]),
+        }
+        | prompt
+        | llm_with_tools
+        | OpenAIToolsAgentOutputParser()
+    )
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    startup_timings["agent"] = time.perf_counter() - started
+    return agent_executor
+
+
+def warmup():
+    """Load the agent and the solvers now rather than on the first request."""
+    started = time.perf_counter()
+    get_agent_executor()
+    # Called directly rather than through compute_queue: its threads would not survive
+    # a fork, and the queue starts them on demand anyway.
+    pfr_expansion_factor(1, 300, 1, 1, 1, 1, 1e-3)
+    startup_timings["warmup"] = time.perf_counter() - started
+
+
+# Routes are added with a stand-in that resolves to the real agent when it is first run.
+agent_executor = RunnableLambda(lambda _: get_agent_executor(), name="AgentExecutor")
+
+# Fully specified numeric questions go straight to the solver, see server/prerouter.py.
+# Self-contained questions that only differ in wording are answered from a local cache
+# instead of another LLM round trip and solve, see server/response_cache.py.
+response_cache = ResponseCache()
+cached_agent = response_cache.wrap(PreRouter(compute_queue).wrap(agent_executor))
 
 
 app = FastAPI(
@@ -203,6 +252,10 @@ app = FastAPI(
     description="Spin up a simple api server using LangChain's Runnable interfaces",
 )
 
+# Cap concurrent agent runs and /pfr solver requests and shed load once the wait
+# queue is full. Registered before CORS so that CORS wraps it and 503 rejections
+# still carry CORS headers.
+app.add_middleware(AdmissionMiddleware)
 
 # Set all CORS enabled origins
 app.add_middleware(
@@ -214,6 +267,11 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Typed solver endpoints for clients that already know the parameters:
+# /pfr/conversion, /pfr/volume-conversion, ... Each accepts one body or a list.
+# /pfr/conversion-sweep solves many volumes of one feed with a single integration.
+app.include_router(pfr_router(compute_queue))
+
 # We need to add these input/output schemas because the current AgentExecutor
 # is lacking in schemas.
 class Input(BaseModel):
@@ -230,6 +288,10 @@ class Input(BaseModel):
     )
 
 
+class SessionInput(BaseModel):
+    input: str
+
+
 class Output(BaseModel):
     output: Any
 
@@ -241,11 +303,47 @@ class Output(BaseModel):
 # /stream_events
 add_routes(
     app,
-    agent_executor.with_types(input_type=Input, output_type=Output).with_config(
+    cached_agent.with_types(input_type=Input, output_type=Output).with_config(
         {"run_name": "agent"}
     ),
 )
 
+# Server-side history for the same agent, keyed by the session_id passed in the
+# request config, e.g. {"configurable": {"session_id": "..."}}. Sessions that outgrow
+# their message cap fold the oldest messages into the same rolling summary the
+# trimmer keeps, so its summary cache stays valid.
+session_store = session_store_from_env(
+    compactor=lambda messages, evict: get_history_trimmer().compact(messages, evict)
+)
+agent_with_history = RunnableWithMessageHistory(
+    cached_agent,
+    session_store.history,
+    input_messages_key="input",
+    history_messages_key="chat_history",
+    output_messages_key="output",
+)
+
+add_routes(
+    app,
+    agent_with_history.with_types(input_type=SessionInput, output_type=Output).with_config(
+        {"run_name": "agent"}
+    ),
+    path="/chat",
+)
+
+
+
+@app.get("/startup")
+def startup():
+    """Seconds spent importing the app and loading the agent and solvers."""
+    return startup_timings
+
+
+if PRELOAD:
+    warmup()
+startup_timings["import"] = time.perf_counter() - _import_started
+logger.info("Server start-up timings: %s", startup_timings)
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+
+# Defaults for a single solve. A "step" is one evaluation of the ODE right-hand side,
+# so an inverse solve (fsolve around solve_ivp) draws all of its forward solves from
+# the same budget.
+SOLVE_TIME_BUDGET = float(os.getenv("ALCHEMY_SOLVE_TIME_BUDGET", "10"))
+SOLVE_STEP_BUDGET = int(os.getenv("ALCHEMY_SOLVE_STEP_BUDGET", "200000"))
+
+
+# What the model and SciPy raise on inputs or states they cannot handle, such as a zero
+# pressure or NaNs reaching Radau's LU decomposition. Solvers report these as
+# DidNotConverge rather than letting them escape to the caller.
+NUMERIC_ERRORS = (ArithmeticError, ValueError)
+
+
+class DidNotConverge(Exception):
+    """Raised when a solver finishes without a usable answer."""
+
+
+class SolveBudgetExceeded(DidNotConverge):
+    """Raised when a solve runs out of time or steps, or is cancelled."""
+
+
+class SolveBudget:
+    """
+    Time and step allowance shared by every solver call made on behalf of one request.
+
+    Solvers call ``charge()`` once per right-hand side evaluation. The check is cheap and
+    raising from inside the right-hand side is what aborts ``solve_ivp`` and ``fsolve``.
+    ``cancel()`` may be called from another thread to stop a solve early.
+    """
+
+    def __init__(self, max_time=None, max_steps=None):
+        self.max_time = SOLVE_TIME_BUDGET if max_time is None else max_time
+        self.max_steps = SOLVE_STEP_BUDGET if max_steps is None else max_steps
+        self.steps = 0
+        self._deadline = time.monotonic() + self.max_time
+        self._cancelled = threading.Event()
+
+    def charge(self, steps=1):
+        self.steps += steps
+        if self._cancelled.is_set():
+            raise SolveBudgetExceeded("solve was cancelled")
+        if self.steps > self.max_steps:
+            raise SolveBudgetExceeded(f"solve exceeded the step budget of {self.max_steps} evaluations")
+        if time.monotonic() > self._deadline:
+            raise SolveBudgetExceeded(f"solve exceeded the time budget of {self.max_time:g} s")
+
+    def cancel(self):
+        self._cancelled.set()
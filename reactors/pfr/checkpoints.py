@@ -0,0 +1,103 @@
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+
+from reactors.budget import NUMERIC_ERRORS, DidNotConverge, SolveBudgetExceeded
+
+
+CHECKPOINT_ENTRIES = int(os.getenv("ALCHEMY_CHECKPOINT_ENTRIES", "256"))
+# When a checkpoint has to be extended it is integrated this much further than asked,
+# so a search creeping up on its answer does not extend it a sliver at a time.
+CHECKPOINT_GROWTH = 1.5
+
+
+class PFRCheckpoint:
+    """
+    Dense solution of one feed and kinetics parameter set, from V=0 up to the furthest
+    volume solved so far.
+
+    Volumes already covered are answered by interpolating the stored solution. Larger
+    volumes continue the integration from the furthest state instead of from V=0.
+    """
+
+    def __init__(self, initial_condition, dFdV):
+        self.initial_condition = initial_condition
+        self.dFdV = dFdV
+        self.V_end = 0.0
+        self.state_end = initial_condition
+        self._ends = []
+        self._solutions = []
+        self._lock = Lock()
+
+    def state_at(self, V, budget):
+        """Molar flow rates at volume ``V`` >= 0."""
+        with self._lock:
+            if V > self.V_end:
+                self._reach(V, budget)
+            if V <= 0 or not self._solutions:
+                return list(self.initial_condition)
+            segment = min(bisect_left(self._ends, V), len(self._ends) - 1)
+            return list(self._solutions[segment](V))
+
+    def _reach(self, V, budget):
+        """
+        Cover volume ``V``: overshoot first, then extend to exactly ``V``, and finally
+        integrate again from the inlet. Continuing from the furthest state can fail where
+        a fresh solve does not, for instance once A has all but run out.
+        """
+        attempts = [(max(V, CHECKPOINT_GROWTH * self.V_end), False)]
+        if attempts[0][0] != V:
+            attempts.append((V, False))
+        if self.V_end > 0:
+            attempts.append((V, True))
+        for target, restart in attempts[:-1]:
+            try:
+                return self._extend(target, budget, restart)
+            except SolveBudgetExceeded:
+                raise
+            except DidNotConverge:
+                pass
+        target, restart = attempts[-1]
+        self._extend(target, budget, restart)
+
+    def _extend(self, V, budget, restart=False):
+        from scipy.integrate import solve_ivp
+
+        start, state = (0.0, self.initial_condition) if restart else (self.V_end, self.state_end)
+        try:
+            sol = solve_ivp(self.dFdV, [start, V], state, dense_output=True, method='Radau',
+                            args=(budget,))
+        except NUMERIC_ERRORS as exc:
+            raise DidNotConverge(f"The integration failed: {exc}") from exc
+        if not sol.success:
+            raise DidNotConverge(sol.message)
+        if restart:
+            self._solutions, self._ends = [], []
+        self._solutions.append(sol.sol)
+        self._ends.append(V)
+        self.V_end = V
+        self.state_end = sol.y[:, -1]
+
+
+class CheckpointStore:
+    """LRU of ``PFRCheckpoint`` keyed by everything except the reactor volume."""
+
+    def __init__(self, max_entries=CHECKPOINT_ENTRIES):
+        self.max_entries = max_entries
+        self._checkpoints = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._checkpoints)
+
+    def get(self, key, model):
+        """The checkpoint for ``key``, created from ``model() -> (initial_condition, dFdV)`` if new."""
+        with self._lock:
+            checkpoint = self._checkpoints.get(key)
+            if checkpoint is None:
+                checkpoint = self._checkpoints[key] = PFRCheckpoint(*model())
+                while len(self._checkpoints) > self.max_entries:
+                    self._checkpoints.popitem(last=False)
+            self._checkpoints.move_to_end(key)
+            return checkpoint
@@ -1,21 +1,44 @@
-from scipy.integrate import solve_ivp
-import numpy as np
-from scipy.optimize import fsolve
-import json
+import math
 
+from reactors.budget import NUMERIC_ERRORS, DidNotConverge, SolveBudget
+from reactors.pfr.checkpoints import PFRCheckpoint
+from reactors.pfr.results import PFRBatchResult, PFRResult
 
-def pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d):
+# Version of the results pfr_expansion_factor returns. Bump it with any change to the
+# model or the integration that changes them, so that caches outliving the process,
+# such as server/result_cache.py, are not reused across the change.
+RESULT_VERSION = 1
+
+# Volume searches double their bracket at most this many times looking for the target
+VOLUME_SEARCH_DOUBLINGS = 40
+
+# Optional cache of pfr_expansion_factor results, see set_result_cache()
+_result_cache = None
+# Optional store of dense solutions to continue from, see set_checkpoint_store()
+_checkpoints = None
+
+
+def set_result_cache(cache):
     """
-    Calculate the conversion and production in an isothermal Plug Flow Reactor with molar expansion given:
-        - Volumetric Flow Rate
-        - Temperature
-        - Initial Pressure
-        - Initial Concentration of A
-        - Initial Concentration of B
-        - Rate Constant
-        - Reactor Volume
-        - The stoichiometric coefficients of the reaction
+    Look pfr_expansion_factor results up in ``cache`` before solving, or stop caching
+    with None. The cache needs ``get(key)`` returning a value or None and ``put(key, value)``,
+    where the key is the tuple of solver parameters and the value ``(conversion, production)``.
     """
+    global _result_cache
+    _result_cache = cache
+
+
+def set_checkpoint_store(store):
+    """
+    Solve through the ``CheckpointStore`` ``store``, or integrate every call from V=0
+    again with None. See reactors/pfr/checkpoints.py.
+    """
+    global _checkpoints
+    _checkpoints = store
+
+
+def _expansion_model(v_0, T, P_0, c_A0, c_B0, k, a, b):
+    """Initial molar flow rates and ``dFdV(V, F, budget)`` of the isothermal PFR with molar expansion."""
     R = 8.206 * 10 ** (-5)
     delta = -1
     F_A0 = c_A0 * v_0
@@ -24,10 +47,9 @@ def pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d):
     F_T0 = F_A0 + F_B0 + F_C0
     e = c_A0 * R * T / P_0 * delta
     initial_condition = [F_A0, F_B0, F_C0]
-    v_bounds = [0, V]
-    v_span = np.linspace(v_bounds[0], v_bounds[1], 101).flatten()
 
-    def dFdV(Vspan, F):
+    def dFdV(Vspan, F, budget):
+        budget.charge()
         F_A = F[0]
         F_B = F[1]
         F_C = F[2]
@@ -40,44 +62,191 @@ def pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d):
         dFdV = [r_A, r_A, -r_A]
         return dFdV
 
-    sol = solve_ivp(dFdV, v_bounds, initial_condition, t_eval=v_span, dense_output=True, method='Radau')
-    F_A, F_B, F_C = sol.y
-    conv = 1 - F_A[-1] / F_A0
-    prod = c_A0 * v_0 * c/a * conv
+    return initial_condition, dFdV
+
+
+def _checkpoint(v_0, T, P_0, c_A0, c_B0, k, a, b):
+    """The checkpoint of this feed from the installed store, or a new one if there is none."""
+    def model():
+        return _expansion_model(v_0, T, P_0, c_A0, c_B0, k, a, b)
+
+    if _checkpoints is None:
+        return PFRCheckpoint(*model())
+    return _checkpoints.get((v_0, T, P_0, c_A0, c_B0, k, a, b), model)
+
+
+def pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a=1, b=1, c=1, d=1, budget=None, checkpoint=True):
+    """
+    Calculate the conversion and production in an isothermal Plug Flow Reactor with molar expansion given:
+        - Volumetric Flow Rate
+        - Temperature
+        - Initial Pressure
+        - Initial Concentration of A
+        - Initial Concentration of B
+        - Rate Constant
+        - Reactor Volume
+        - The stoichiometric coefficients of the reaction (elementary A + B -> C by default)
+
+    The integration is charged against ``budget`` and raises ``SolveBudgetExceeded`` once it runs out.
+    It continues from the installed checkpoint store unless ``checkpoint`` is False, which
+    searches over anything but the volume pass so that their one-off probes do not
+    evict reusable checkpoints.
+    """
+    cache = _result_cache
+    if cache is not None:
+        key = (v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    if budget is None:
+        budget = SolveBudget()
+    try:
+        F_A0 = c_A0 * v_0
+
+        if checkpoint and _checkpoints is not None and V >= 0:
+            F_A = _checkpoint(v_0, T, P_0, c_A0, c_B0, k, a, b).state_at(V, budget)[0]
+        else:
+            # SciPy is imported on first use to keep importing the reactor packages cheap
+            import numpy as np
+            from scipy.integrate import solve_ivp
+
+            initial_condition, dFdV = _expansion_model(v_0, T, P_0, c_A0, c_B0, k, a, b)
+            v_bounds = [0, V]
+            v_span = np.linspace(v_bounds[0], v_bounds[1], 101).flatten()
+            sol = solve_ivp(dFdV, v_bounds, initial_condition, t_eval=v_span, dense_output=True, method='Radau',
+                            args=(budget,))
+            if not sol.success:
+                raise DidNotConverge(sol.message)
+            F_A = sol.y[0][-1]
+        conv = 1 - F_A / F_A0
+        prod = c_A0 * v_0 * c/a * conv
+    except NUMERIC_ERRORS as exc:
+        raise DidNotConverge(f"The integration failed: {exc}") from exc
+    if not (math.isfinite(conv) and math.isfinite(prod)):
+        raise DidNotConverge("The integration did not give a finite conversion.")
+    if cache is not None:
+        cache.put(key, (conv, prod))
     return conv, prod
 
 
-def pfr_conversion(v_0, T, P_0, c_A0, c_B0, k, V):
-    conv, prod = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": T,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": V,
-        "conversion": conv,
-    }
-    return json.dumps(plug_flow_conversion_dict)
-
-
-def pfr_production(v_0, T, P_0, c_A0, c_B0, k, V):
-    conv, prod = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": T,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": V,
-        "conversion": prod,
-    }
-    return json.dumps(plug_flow_conversion_dict)
-
-
-def pfr_expansion_volume_conversion(v_0, T, P_0, c_A0, c_B0, k, X):
+def pfr_conversion_sweep(v_0, T, P_0, c_A0, c_B0, k, volumes, a=1, b=1, c=1, d=1, budget=None):
+    """
+    Conversion and production at each of ``volumes``, as a ``PFRBatchResult``.
+
+    The sweep is solved through a checkpoint, so it costs one integration up to the
+    largest volume however many volumes are asked for.
+    """
+    if budget is None:
+        budget = SolveBudget()
+    volumes = list(volumes)
+    batch = PFRBatchResult(len(volumes))
+    try:
+        checkpoint = _checkpoint(v_0, T, P_0, c_A0, c_B0, k, a, b)
+    except NUMERIC_ERRORS as exc:
+        for i, V in enumerate(volumes):
+            batch[i] = PFRResult(v_0, T, P_0, c_A0, c_B0, k, reactor_volume=V).did_not_converge(
+                f"The integration failed: {exc}")
+        return batch
+    # Largest volume first, so that the rest are interpolated
+    for i in sorted(range(len(volumes)), key=lambda i: -volumes[i]):
+        result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, reactor_volume=volumes[i])
+        if not _is_volume(volumes[i]):
+            batch[i] = result.did_not_converge("The reactor volume must not be negative.")
+            continue
+        try:
+            F_A = checkpoint.state_at(volumes[i], budget)[0]
+            result.conversion = 1 - F_A / (c_A0 * v_0)
+            result.production = c_A0 * v_0 * c/a * result.conversion
+            if not (math.isfinite(result.conversion) and math.isfinite(result.production)):
+                raise DidNotConverge("The integration did not give a finite conversion.")
+        except NUMERIC_ERRORS as exc:
+            result.conversion = result.production = None
+            result.did_not_converge(f"The integration failed: {exc}")
+        except DidNotConverge as exc:
+            result.conversion = result.production = None
+            result.did_not_converge(exc)
+        batch[i] = result
+    return batch
+
+
+def _is_volume(V):
+    return V >= 0
+
+
+def _is_temperature(T):
+    return T > 0
+
+
+def solve_inverse(objective, guess, valid=None, name="solution"):
+    """
+    Root-find ``objective`` with fsolve, raising ``DidNotConverge`` instead of returning a
+    non-root when fsolve gives up, or a root for which ``valid(root)`` is false.
+    """
+    from scipy.optimize import fsolve
+
+    # fsolve works on arrays; the objectives, and the result cache keys, want plain floats
+    x, info, ier, mesg = fsolve(lambda x: objective(float(x[0])), guess, full_output=True)
+    if ier != 1:
+        raise DidNotConverge(mesg)
+    if valid is not None and not valid(x[0]):
+        raise DidNotConverge(f"The only {name} found, {x[0]:g}, is not physical.")
+    return x[0]
+
+
+def pfr_conversion(v_0, T, P_0, c_A0, c_B0, k, V, a=1, b=1, c=1, d=1, budget=None):
+    result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, reactor_volume=V)
+    try:
+        result.conversion, prod = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d, budget=budget)
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
+
+
+def pfr_production(v_0, T, P_0, c_A0, c_B0, k, V, budget=None):
+    result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, reactor_volume=V)
+    try:
+        conv, result.production = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, budget=budget)
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
+
+
+def pfr_volume_for_conversion(v_0, T, P_0, c_A0, c_B0, k, X, a=1, b=1, c=1, d=1, budget=None, guess=1):
+    """
+    Find the reactor volume needed to achieve a target conversion of A.
+
+    The feed's checkpoint is extended, doubling from ``guess``, until it reaches the
+    conversion, and the volume is then bracketed with brentq on its dense solution, so
+    the search costs about one integration. Raises ``DidNotConverge`` if the conversion
+    is not reached or no volume is found within the budget.
+    """
+    from scipy.optimize import brentq
+
+    if budget is None:
+        budget = SolveBudget()
+    if not 0 < X < 1:
+        raise DidNotConverge(f"A conversion of {X:g} is not between 0 and 1.")
+    try:
+        checkpoint = _checkpoint(v_0, T, P_0, c_A0, c_B0, k, a, b)
+        F_A0 = c_A0 * v_0
+
+        def objective(V):
+            return 1 - checkpoint.state_at(V, budget)[0] / F_A0 - X
+
+        lower, upper = 0.0, guess
+        for _ in range(VOLUME_SEARCH_DOUBLINGS):
+            if objective(upper) >= 0:
+                break
+            lower, upper = upper, 2 * upper
+        else:
+            raise DidNotConverge(f"A conversion of {X:g} is not reached within {upper:g} m^3.")
+        return brentq(objective, lower, upper)
+    except NUMERIC_ERRORS as exc:
+        raise DidNotConverge(f"The volume search failed: {exc}") from exc
+
+
+def pfr_expansion_volume_conversion(v_0, T, P_0, c_A0, c_B0, k, X, a=1, b=1, c=1, d=1, budget=None):
     """
     Find the reactor volume needed to achieve a target conversion of A.
 
@@ -89,30 +258,20 @@ def pfr_expansion_volume_conversion(v_0, T, P_0, c_A0, c_B0, k, X):
     - c_A0: Initial Concentration of A
     - c_B0: Initial Concentration of B
     - k: Rate Constant
-    - V_max: Maximum reactor volume to consider
+    - a, b, c, d: Stoichiometric coefficients of A, B, C and D
 
     Returns:
-    - V: Reactor volume that achieves the target conversion
+    - A PFRResult with the reactor volume that achieves the target conversion
     """
-    def objective(V):
-        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
-        return conv_calc - X
-
-    v_solve = fsolve(objective, 10)[0]
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": T,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": v_solve,
-        "conversion": X,
-    }
-    return json.dumps(plug_flow_conversion_dict)
+    result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, conversion=X)
+    try:
+        result.reactor_volume = pfr_volume_for_conversion(v_0, T, P_0, c_A0, c_B0, k, X, a, b, c, d, budget=budget)
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
 
 
-def pfr_expansion_volume_production(v_0, T, P_0, c_A0, c_B0, k, prod):
+def pfr_expansion_volume_production(v_0, T, P_0, c_A0, c_B0, k, prod, budget=None):
     """
     Find the reactor volume needed to achieve a target production of C.
 
@@ -128,25 +287,19 @@ def pfr_expansion_volume_production(v_0, T, P_0, c_A0, c_B0, k, prod):
     Returns:
     - V: Reactor volume that achieves the target production
     """
-    def objective(V):
-        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
-        return prod - prod_calc
-
-    v_solve = fsolve(objective, 10)[0]
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": T,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": v_solve,
-        "production": prod,
-    }
-    return json.dumps(plug_flow_conversion_dict)
+    result = PFRResult(v_0, T, P_0, c_A0, c_B0, k, production=prod)
+    try:
+        # Production of C is c_A0 * v_0 * X, so this is a search for that conversion
+        X = prod / (c_A0 * v_0)
+        result.reactor_volume = pfr_volume_for_conversion(v_0, T, P_0, c_A0, c_B0, k, X, budget=budget)
+    except ZeroDivisionError as exc:
+        result.did_not_converge(f"The volume search failed: {exc}")
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
 
 
-def pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, V, X):
+def pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, V, X, budget=None):
     """
     Find the reactor temperature needed to achieve a target conversion of A.
 
@@ -162,25 +315,22 @@ def pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, V, X):
     Returns:
     - T: Reactor temperature that achieves the target conversion
     """
+    if budget is None:
+        budget = SolveBudget()
+
     def objective(T):
-        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
+        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, budget=budget, checkpoint=False)
         return conv_calc - X
 
-    t_solve = fsolve(objective, 10)[0]
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": t_solve,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": V,
-        "conversion": X,
-    }
-    return json.dumps(plug_flow_conversion_dict)
+    result = PFRResult(v_0, None, P_0, c_A0, c_B0, k, reactor_volume=V, conversion=X)
+    try:
+        result.temperature = solve_inverse(objective, 10, _is_temperature, "temperature")
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
 
 
-def pfr_expansion_temperature_production(v_0, P_0, c_A0, c_B0, k, V, prod):
+def pfr_expansion_temperature_production(v_0, P_0, c_A0, c_B0, k, V, prod, budget=None):
     """
     Find the reactor temperature needed to achieve a target production of C.
 
@@ -196,19 +346,16 @@ def pfr_expansion_temperature_production(v_0, P_0, c_A0, c_B0, k, V, prod):
     Returns:
     - T: Reactor temperature that achieves the target production
     """
+    if budget is None:
+        budget = SolveBudget()
+
     def objective(T):
-        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V)
+        conv_calc, prod_calc = pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, budget=budget, checkpoint=False)
         return prod - prod_calc
 
-    t_solve = fsolve(objective, 10)[0]
-    plug_flow_conversion_dict = {
-        "initial_volumetric_flowrate": v_0,
-        "temperature": t_solve,
-        "initial_pressure": P_0,
-        "initial_concentration_of_A": c_A0,
-        "initial_concentration_of_B": c_B0,
-        "rate_constant": k,
-        "reactor_volume": V,
-        "production": prod,
-    }
-    return json.dumps(plug_flow_conversion_dict)
+    result = PFRResult(v_0, None, P_0, c_A0, c_B0, k, reactor_volume=V, production=prod)
+    try:
+        result.temperature = solve_inverse(objective, 10, _is_temperature, "temperature")
+    except DidNotConverge as exc:
+        result.did_not_converge(exc)
+    return result
@@ -0,0 +1,142 @@
+import json
+import math
+
+
+# Serialized field names, in output order. They match the keys of the dicts the solvers
+# used to build, so existing consumers of the JSON see the same payload.
+FIELDS = (
+    "initial_volumetric_flowrate",
+    "temperature",
+    "initial_pressure",
+    "initial_concentration_of_A",
+    "initial_concentration_of_B",
+    "rate_constant",
+    "reactor_volume",
+    "conversion",
+    "production",
+)
+
+
+class PFRResult:
+    """
+    Inputs and outputs of one PFR solve.
+
+    Quantities the solve did not involve are None and are left out when serialized. A
+    failed solve has ``converged`` False and a ``reason``, and serializes with both.
+    Serialization is lossless: ``PFRResult.from_dict(result.to_dict()) == result``.
+    """
+
+    __slots__ = FIELDS + ("converged", "reason")
+
+    def __init__(self, initial_volumetric_flowrate=None, temperature=None, initial_pressure=None,
+                 initial_concentration_of_A=None, initial_concentration_of_B=None, rate_constant=None,
+                 reactor_volume=None, conversion=None, production=None, converged=True, reason=None):
+        self.initial_volumetric_flowrate = initial_volumetric_flowrate
+        self.temperature = temperature
+        self.initial_pressure = initial_pressure
+        self.initial_concentration_of_A = initial_concentration_of_A
+        self.initial_concentration_of_B = initial_concentration_of_B
+        self.rate_constant = rate_constant
+        self.reactor_volume = reactor_volume
+        self.conversion = conversion
+        self.production = production
+        self.converged = converged
+        self.reason = reason
+
+    def did_not_converge(self, reason):
+        self.converged = False
+        self.reason = str(reason)
+        return self
+
+    def to_dict(self):
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = float(value)
+        if not self.converged:
+            data["converged"] = False
+            data["reason"] = self.reason
+        return data
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __eq__(self, other):
+        if not isinstance(other, PFRResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f"PFRResult({self.to_dict()!r})"
+
+
+class PFRBatchResult:
+    """
+    Results of many solves stored column by column.
+
+    Each field is a float64 array with NaN where the solve did not involve it, so a batch
+    costs a handful of arrays rather than a dict per case. Rows are materialized only
+    when indexed or serialized.
+    """
+
+    def __init__(self, size):
+        import numpy as np
+
+        self.columns = {field: np.full(size, np.nan) for field in FIELDS}
+        self.converged = np.ones(size, dtype=bool)
+        # Failures are rare, so their reasons are kept by row index
+        self.reasons = {}
+
+    @classmethod
+    def from_results(cls, results):
+        results = list(results)
+        batch = cls(len(results))
+        for i, result in enumerate(results):
+            batch[i] = result
+        return batch
+
+    def __len__(self):
+        return len(self.converged)
+
+    def __setitem__(self, i, result):
+        for field in FIELDS:
+            value = getattr(result, field)
+            self.columns[field][i] = math.nan if value is None else value
+        self.converged[i] = result.converged
+        if result.converged:
+            self.reasons.pop(i, None)
+        else:
+            self.reasons[i] = result.reason
+
+    def __getitem__(self, i):
+        values = {}
+        for field in FIELDS:
+            value = float(self.columns[field][i])
+            if not math.isnan(value):
+                values[field] = value
+        return PFRResult(**values, converged=bool(self.converged[i]), reason=self.reasons.get(i))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_records(self):
+        """One dict per case, the same as ``[result.to_dict() for result in batch]``."""
+        return [result.to_dict() for result in self]
+
+    def to_columns(self):
+        """One list per field, with None where a case did not involve the field."""
+        columns = {
+            field: [None if math.isnan(value) else value for value in column.tolist()]
+            for field, column in self.columns.items()
+        }
+        columns["converged"] = self.converged.tolist()
+        columns["reason"] = [self.reasons.get(i) for i in range(len(self))]
+        return columns
+
+    def to_json(self):
+        return json.dumps(self.to_columns())
@@ -4,20 +4,20 @@ from reactors.pfr.molar_expansion import (
 )
 
 from pydantic import BaseModel, Field
-from langchain.tools import BaseTool
-from typing import Type
+from langchain_core.tools import BaseTool
+from typing import List, Type
 
 
 class PlugFlowConversionCheckInput(BaseModel):
     """Input schema for PlugFLowConversionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    temperature: float = Field(..., description="The temperature of the reactor in kelvin")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    volume: float = Field(..., description="The volume of the reactor in cubic meters")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    temperature: float = Field(..., gt=0, description="The temperature of the reactor in kelvin")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    volume: float = Field(..., gt=0, description="The volume of the reactor in cubic meters")
 
 
 class PlugFlowConversionTool(BaseTool):
@@ -28,7 +28,7 @@ class PlugFlowConversionTool(BaseTool):
     in cubic meters per moles per min, and reactor volume is in cubic meters."""
 
     def _run(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, volume: float):
-        return pfr_conversion(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, volume)
+        return pfr_conversion(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, volume).to_json()
 
     def _arun(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, volume: float):
         return NotImplementedError("This tool does not support async")
@@ -39,13 +39,13 @@ class PlugFlowConversionTool(BaseTool):
 class PlugFlowProductionCheckInput(BaseModel):
     """Input schema for PlugFLowProductionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    temperature: float = Field(..., description="The temperature of the reactor in kelvin")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    volume: float = Field(..., description="The volume of the reactor in cubic meters")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    temperature: float = Field(..., gt=0, description="The temperature of the reactor in kelvin")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    volume: float = Field(..., gt=0, description="The volume of the reactor in cubic meters")
 
 
 class PlugFlowProductionTool(BaseTool):
@@ -56,7 +56,7 @@ class PlugFlowProductionTool(BaseTool):
     in cubic meters per moles per min, and reactor volume is in cubic meters."""
 
     def _run(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, volume: float):
-        return pfr_production(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, volume)
+        return pfr_production(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, volume).to_json()
 
     def _arun(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, volume: float):
         return NotImplementedError("This tool does not support async")
@@ -67,13 +67,13 @@ class PlugFlowProductionTool(BaseTool):
 class PlugFlowVolumeConversionCheckInput(BaseModel):
     """Input schema for PlugFLowVolumeConversionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    temperature: float = Field(..., description="The temperature of the reactor in kelvin")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    conversion: float = Field(..., description="The conversion of the limiting reactant")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    temperature: float = Field(..., gt=0, description="The temperature of the reactor in kelvin")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    conversion: float = Field(..., gt=0, lt=1, description="The conversion of the limiting reactant")
 
 
 class PlugFlowVolumeConversionTool(BaseTool):
@@ -84,7 +84,7 @@ class PlugFlowVolumeConversionTool(BaseTool):
     in cubic meters per moles per min."""
 
     def _run(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, conversion: float):
-        return pfr_expansion_volume_conversion(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, conversion)
+        return pfr_expansion_volume_conversion(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, conversion).to_json()
 
     def _arun(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, conversion: float):
         return NotImplementedError("This tool does not support async")
@@ -95,13 +95,13 @@ class PlugFlowVolumeConversionTool(BaseTool):
 class PlugFlowVolumeProductionCheckInput(BaseModel):
     """Input schema for PlugFLowVolumeProductionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    temperature: float = Field(..., description="The temperature of the reactor in kelvin")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    production: float = Field(..., description="The production of the product in moles per min")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    temperature: float = Field(..., gt=0, description="The temperature of the reactor in kelvin")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    production: float = Field(..., gt=0, description="The production of the product in moles per min")
 
 
 class PlugFlowVolumeProductionTool(BaseTool):
@@ -112,7 +112,7 @@ class PlugFlowVolumeProductionTool(BaseTool):
     in cubic meters per moles per minute, and production rate is in moles per minute."""
 
     def _run(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, production: float):
-        return pfr_expansion_volume_production(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, production)
+        return pfr_expansion_volume_production(volumetric, temperature, pressure, concentrationOfA, concentrationOfB, rateConstant, production).to_json()
 
     def _arun(self, volumetric: float, temperature: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, production: float):
         return NotImplementedError("This tool does not support async")
@@ -123,13 +123,13 @@ class PlugFlowVolumeProductionTool(BaseTool):
 class PlugFlowTemperatureConversionCheckInput(BaseModel):
     """Input schema for PlugFLowConversionProductionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    volume: float = Field(..., description="The volume of the reactor in cubic meters")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    conversion: float = Field(..., description="The conversion of the limiting reactant")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    volume: float = Field(..., gt=0, description="The volume of the reactor in cubic meters")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    conversion: float = Field(..., gt=0, lt=1, description="The conversion of the limiting reactant")
 
 
 class PlugFlowTemperatureConversionTool(BaseTool):
@@ -140,7 +140,7 @@ class PlugFlowTemperatureConversionTool(BaseTool):
     in cubic meters per moles per minute."""
 
     def _run(self, volumetric: float, volume: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, conversion: float):
-        return pfr_expansion_temperature_conversion(volumetric, volume, pressure, concentrationOfA, concentrationOfB, rateConstant, conversion)
+        return pfr_expansion_temperature_conversion(volumetric, pressure, concentrationOfA, concentrationOfB, rateConstant, volume, conversion).to_json()
 
     def _arun(self, volumetric: float, volume: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, conversion: float):
         return NotImplementedError("This tool does not support async")
@@ -151,13 +151,13 @@ class PlugFlowTemperatureConversionTool(BaseTool):
 class PlugFlowTemperatureProductionCheckInput(BaseModel):
     """Input schema for PlugFLowTemperatureProductionInput"""
 
-    volumetric: float = Field(..., decsription="The volumetric flow rate of the feed in cubic meters per minute")
-    volume: float = Field(..., description="The volume of the reactor in cubic meters")
-    pressure: float = Field(..., description="The pressure of the reactor in atm")
-    concentrationOfA: float = Field(..., description="The concentration of A in moles per cubic meters")
-    concentrationOfB: float = Field(..., description="The concentration of B in moles per cubic meters")
-    rateConstant: float = Field(..., description="The rate constant of the reaction in cubic meters per mole per minute")
-    production: float = Field(..., description="The production of the product in moles per min")
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    volume: float = Field(..., gt=0, description="The volume of the reactor in cubic meters")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    production: float = Field(..., gt=0, description="The production of the product in moles per min")
 
 
 class PlugFlowTemperatureProductionTool(BaseTool):
@@ -168,9 +168,21 @@ class PlugFlowTemperatureProductionTool(BaseTool):
     in cubic meters per moles per minute, and production rate is in moles per minute."""
 
     def _run(self, volumetric: float, volume: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, production: float):
-        return pfr_expansion_temperature_production(volumetric, volume, pressure, concentrationOfA, concentrationOfB, rateConstant, production)
+        return pfr_expansion_temperature_production(volumetric, pressure, concentrationOfA, concentrationOfB, rateConstant, volume, production).to_json()
 
     def _arun(self, volumetric: float, volume: float, pressure: float, concentrationOfA: float, concentrationOfB: float, rateConstant: float, production: float):
         return NotImplementedError("This tool does not support async")
 
     args_schema: Type[BaseModel] = PlugFlowTemperatureProductionCheckInput
+
+
+class PlugFlowConversionSweepInput(BaseModel):
+    """Input schema for a conversion sweep over reactor volumes"""
+
+    volumetric: float = Field(..., gt=0, description="The volumetric flow rate of the feed in cubic meters per minute")
+    temperature: float = Field(..., gt=0, description="The temperature of the reactor in kelvin")
+    pressure: float = Field(..., gt=0, description="The pressure of the reactor in atm")
+    concentrationOfA: float = Field(..., gt=0, description="The concentration of A in moles per cubic meters")
+    concentrationOfB: float = Field(..., gt=0, description="The concentration of B in moles per cubic meters")
+    rateConstant: float = Field(..., gt=0, description="The rate constant of the reaction in cubic meters per mole per minute")
+    volumes: List[float] = Field(..., description="The volumes of the reactor in cubic meters")
@@ -0,0 +1,124 @@
+"""Admission control for the agent server.
+
+Two layers keep tail latency bounded when requests arrive in bursts:
+
+* ``AdmissionMiddleware`` caps how many agent runs and typed solver requests are in
+  flight at once and how many may wait for a slot. Anything beyond that is rejected
+  immediately with a 503.
+* ``ComputeQueue`` runs the solver tools on a fixed pool of threads with a bounded
+  backlog. Each solve gets its own ``SolveBudget`` and is cancelled if it outlives the
+  queue timeout, so a single badly conditioned problem cannot hold a worker forever.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import BoundedSemaphore
+
+from starlette.responses import JSONResponse
+
+from reactors.budget import SolveBudget, SolveBudgetExceeded
+
+
+MAX_CONCURRENT_RUNS = int(os.getenv("ALCHEMY_MAX_CONCURRENT_RUNS", "8"))
+MAX_QUEUED_RUNS = int(os.getenv("ALCHEMY_MAX_QUEUED_RUNS", "16"))
+RUN_QUEUE_TIMEOUT = float(os.getenv("ALCHEMY_RUN_QUEUE_TIMEOUT", "5"))
+
+COMPUTE_WORKERS = int(os.getenv("ALCHEMY_COMPUTE_WORKERS", str(os.cpu_count() or 1)))
+MAX_QUEUED_SOLVES = int(os.getenv("ALCHEMY_MAX_QUEUED_SOLVES", "32"))
+SOLVE_TIMEOUT = float(os.getenv("ALCHEMY_SOLVE_TIMEOUT", "15"))
+
+# The endpoints add_routes creates for running the agent. Schema and playground routes
+# are cheap and are never throttled.
+AGENT_ENDPOINTS = ("/invoke", "/batch", "/stream", "/stream_log", "/stream_events")
+# The typed solver endpoints, see server/pfr_routes.py
+SOLVER_PREFIXES = ("/pfr/",)
+
+
+class ComputeQueueFull(Exception):
+    """Raised when the compute queue has no room for another solve."""
+
+
+class ComputeQueue:
+    """Bounded pool that runs solver calls with a per-solve budget."""
+
+    def __init__(self, workers=COMPUTE_WORKERS, max_queued=MAX_QUEUED_SOLVES, timeout=SOLVE_TIMEOUT):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="solver")
+        self._slots = BoundedSemaphore(workers + max_queued)
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run ``fn(*args, budget=..., **kwargs)`` on the pool and return its result.
+
+        Raises ``ComputeQueueFull`` without waiting when the pool and its backlog are
+        full, and ``SolveBudgetExceeded`` if the solve does not finish within the timeout.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ComputeQueueFull("the solver is saturated, try again shortly")
+        budget = kwargs.pop("budget", None) or SolveBudget(max_time=self.timeout)
+        try:
+            future = self._executor.submit(fn, *args, budget=budget, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # A solve still waiting in the backlog never starts. A running one notices on
+            # its next right-hand side evaluation and frees its slot.
+            future.cancel()
+            budget.cancel()
+            raise SolveBudgetExceeded(f"solve did not finish within {self.timeout:g} s")
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware limiting concurrent agent runs and solver requests.
+
+    The slot is held until the response has been fully sent, so streamed responses count
+    for their whole duration.
+    """
+
+    def __init__(self, app, max_concurrent=MAX_CONCURRENT_RUNS, max_queued=MAX_QUEUED_RUNS,
+                 queue_timeout=RUN_QUEUE_TIMEOUT, endpoints=AGENT_ENDPOINTS, prefixes=SOLVER_PREFIXES):
+        self.app = app
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.endpoints = endpoints
+        self.prefixes = prefixes
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (
+            scope["path"].endswith(self.endpoints) or scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked() and self._waiting >= self.max_queued:
+            await self._reject(scope, receive, send)
+            return
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            await self._reject(scope, receive, send)
+            return
+        finally:
+            self._waiting -= 1
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(
+            {"detail": "Server is busy, please retry shortly."},
+            status_code=503,
+            headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+        )
+        await response(scope, receive, send)
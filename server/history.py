@@ -0,0 +1,175 @@
+"""Token-budgeted chat history for the agent.
+
+``HistoryTrimmer`` keeps the most recent turns verbatim and folds everything older,
+tool results included, into a rolling summary that is prepended as a system message.
+The system prompt lives in the prompt template and is never touched.
+
+Summaries are cached by a digest of the messages they cover. Digests are chained, so
+the summary of messages ``[:n]`` can be extended with messages ``[n:m]`` instead of
+being rebuilt from scratch, and a conversation keeps reusing its current summary until
+the recent window outgrows the budget again.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("ALCHEMY_HISTORY_TOKEN_BUDGET", "2000"))
+# Once over budget, recent turns are trimmed down to this fraction of the budget so the
+# next few turns fit without summarizing again.
+HISTORY_LOW_WATERMARK = float(os.getenv("ALCHEMY_HISTORY_LOW_WATERMARK", "0.5"))
+SUMMARY_CACHE_SIZE = int(os.getenv("ALCHEMY_SUMMARY_CACHE_SIZE", "1024"))
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_INSTRUCTIONS = (
+    "Condense the conversation below into a short summary for a reactor engineering assistant. "
+    "Keep every reactor parameter, number, unit and computed result, and what the user is trying "
+    "to design. Drop greetings and small talk.\n\n"
+)
+# Rough per-message overhead of the chat format, in tokens.
+MESSAGE_OVERHEAD = 4
+
+
+class HistoryTrimmer:
+    """Trim ``chat_history`` to a token budget, summarizing what falls off the front."""
+
+    def __init__(self, llm, budget=HISTORY_TOKEN_BUDGET, low_watermark=HISTORY_LOW_WATERMARK,
+                 cache_size=SUMMARY_CACHE_SIZE, encoding="cl100k_base"):
+        self.llm = llm
+        self.budget = budget
+        self.low_watermark = low_watermark
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()
+        self._lock = Lock()
+        self._encoding = _load_encoding(encoding)
+
+    def __call__(self, messages):
+        messages = list(messages)
+        sizes = [self.count_tokens(message) for message in messages]
+        if sum(sizes) <= self.budget:
+            return messages
+
+        digests = _prefix_digests(messages)
+
+        # Reuse the newest cached summary whose remaining tail still fits.
+        for split in range(len(messages), 0, -1):
+            summary = self._cached(digests[split])
+            if summary is not None and self._fits(summary, sizes[split:], self.budget):
+                return [SystemMessage(content=SUMMARY_PREFIX + summary)] + messages[split:]
+
+        split = self._split_point(messages, sizes)
+        if split == 0:
+            return messages  # only the latest message, which is never summarized
+        summary = self._summarize(messages, digests, split)
+        return [SystemMessage(content=SUMMARY_PREFIX + summary)] + messages[split:]
+
+    def compact(self, messages, evict):
+        """
+        Fold at least the first ``evict`` messages into a summary message, for a session
+        store that has to bound the history it keeps.
+
+        Returns ``[summary] + messages[split:]``. The summary the prompt already uses is
+        reused when it covers enough, and the compacted history is seeded into the
+        cache, so later turns extend the same rolling summary instead of starting over.
+        """
+        messages = list(messages)
+        digests = _prefix_digests(messages)
+        for split in range(len(messages) - 1, evict - 1, -1):
+            summary = self._cached(digests[split])
+            if summary is not None:
+                break
+        else:
+            sizes = [self.count_tokens(message) for message in messages]
+            split = max(evict, self._split_point(messages, sizes))
+            while split < len(messages) - 1 and not isinstance(messages[split], HumanMessage):
+                split += 1
+            summary = self._summarize(messages, digests, split)
+        head = SystemMessage(content=SUMMARY_PREFIX + summary)
+        self._store(_prefix_digests([head])[1], summary)
+        return [head] + messages[split:]
+
+    def count_tokens(self, message):
+        text = _render(message)
+        if self._encoding is None:
+            return len(text) // 4 + MESSAGE_OVERHEAD
+        return len(self._encoding.encode(text)) + MESSAGE_OVERHEAD
+
+    def _fits(self, summary, tail_sizes, limit):
+        summary_size = self.count_tokens(SystemMessage(content=SUMMARY_PREFIX + summary))
+        return summary_size + sum(tail_sizes) <= limit
+
+    def _split_point(self, messages, sizes):
+        """Index of the first message kept verbatim, aiming for the low watermark."""
+        target = self.budget * self.low_watermark
+        split, kept = len(messages), 0
+        while split > 0 and kept + sizes[split - 1] <= target:
+            split -= 1
+            kept += sizes[split]
+        # Always keep the latest message, and start the kept window on a user turn so
+        # an answer is never separated from its question.
+        split = min(split, len(messages) - 1)
+        while 0 < split < len(messages) - 1 and not isinstance(messages[split], HumanMessage):
+            split += 1
+        return min(max(split, 1), len(messages) - 1)
+
+    def _summarize(self, messages, digests, split):
+        start, previous = 0, None
+        for j in range(split, 0, -1):
+            previous = self._cached(digests[j])
+            if previous is not None:
+                start = j
+                break
+        if previous is not None and start == split:
+            return previous
+
+        text = SUMMARY_INSTRUCTIONS
+        if previous:
+            text += f"Summary so far:\n{previous}\n\nNew messages:\n"
+        text += "\n".join(_render(message) for message in messages[start:split])
+
+        summary = self.llm.invoke(text, config={"tags": ["history_summary"]}).content
+        self._store(digests[split], summary)
+        return summary
+
+    def _cached(self, digest):
+        with self._lock:
+            summary = self._summaries.get(digest)
+            if summary is not None:
+                self._summaries.move_to_end(digest)
+            return summary
+
+    def _store(self, digest, summary):
+        with self._lock:
+            self._summaries[digest] = summary
+            self._summaries.move_to_end(digest)
+            while len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+
+
+def _render(message):
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    return f"{message.type}: {content}"
+
+
+def _prefix_digests(messages):
+    """``digests[i]`` identifies ``messages[:i]``."""
+    digests = [b""]
+    for message in messages:
+        digests.append(hashlib.sha1(digests[-1] + _render(message).encode()).digest())
+    return digests
+
+
+def _load_encoding(name):
+    try:
+        import tiktoken
+    except ImportError:  # pragma: no cover - tiktoken ships with langchain_openai
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception:
+        # The encoding is downloaded on first use; fall back to a character estimate
+        # rather than failing requests when that is not possible.
+        return None
@@ -0,0 +1,146 @@
+"""Typed PFR endpoints that call the solvers directly, without the agent.
+
+Every endpoint takes the input schema of the matching tool in reactors/pfr/tools.py,
+or a list of them for a batch, and returns the solver result or a list of results in
+the same order. ``/pfr/conversion-sweep`` takes one feed and a list of volumes, and
+solves them all with a single integration. Batches and sweeps can be returned column
+by column with ``?columnar=true``.
+Solves share the server's compute queue, so they get the same time budget and load
+shedding as the agent's tools.
+
+Batches and sweeps are capped at ``MAX_PFR_BATCH`` items, and larger ones are rejected
+with a 413.
+A batch item the compute queue has no room for, or that would start after
+``PFR_BATCH_TIMEOUT``, is returned as a failed row rather than failing the whole batch.
+"""
+import os
+import time
+from typing import List, Union
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+from reactors.budget import DidNotConverge
+from reactors.pfr.molar_expansion import (
+    pfr_conversion, pfr_conversion_sweep, pfr_production, pfr_expansion_volume_conversion, pfr_expansion_volume_production,
+    pfr_expansion_temperature_conversion, pfr_expansion_temperature_production
+)
+from reactors.pfr.results import PFRBatchResult, PFRResult
+from reactors.pfr.tools import (
+    PlugFlowConversionCheckInput, PlugFlowConversionSweepInput, PlugFlowProductionCheckInput, PlugFlowVolumeConversionCheckInput,
+    PlugFlowVolumeProductionCheckInput, PlugFlowTemperatureConversionCheckInput,
+    PlugFlowTemperatureProductionCheckInput
+)
+from server.admission import ComputeQueueFull
+
+
+MAX_PFR_BATCH = int(os.getenv("ALCHEMY_MAX_PFR_BATCH", "256"))
+PFR_BATCH_TIMEOUT = float(os.getenv("ALCHEMY_PFR_BATCH_TIMEOUT", "30"))
+
+# path: (input schema, solver, schema fields in the solver's argument order)
+PFR_ENDPOINTS = {
+    "conversion": (
+        PlugFlowConversionCheckInput, pfr_conversion,
+        ("volumetric", "temperature", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "volume"),
+    ),
+    "production": (
+        PlugFlowProductionCheckInput, pfr_production,
+        ("volumetric", "temperature", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "volume"),
+    ),
+    "volume-conversion": (
+        PlugFlowVolumeConversionCheckInput, pfr_expansion_volume_conversion,
+        ("volumetric", "temperature", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "conversion"),
+    ),
+    "volume-production": (
+        PlugFlowVolumeProductionCheckInput, pfr_expansion_volume_production,
+        ("volumetric", "temperature", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "production"),
+    ),
+    "temperature-conversion": (
+        PlugFlowTemperatureConversionCheckInput, pfr_expansion_temperature_conversion,
+        ("volumetric", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "volume", "conversion"),
+    ),
+    "temperature-production": (
+        PlugFlowTemperatureProductionCheckInput, pfr_expansion_temperature_production,
+        ("volumetric", "pressure", "concentrationOfA", "concentrationOfB", "rateConstant", "volume", "production"),
+    ),
+}
+
+# Tool schema field -> PFRResult field
+RESULT_FIELDS = {
+    "volumetric": "initial_volumetric_flowrate",
+    "temperature": "temperature",
+    "pressure": "initial_pressure",
+    "concentrationOfA": "initial_concentration_of_A",
+    "concentrationOfB": "initial_concentration_of_B",
+    "rateConstant": "rate_constant",
+    "volume": "reactor_volume",
+    "conversion": "conversion",
+    "production": "production",
+}
+
+
+def pfr_router(compute_queue, max_batch=MAX_PFR_BATCH, batch_timeout=PFR_BATCH_TIMEOUT):
+    """Build the ``/pfr`` router on top of ``compute_queue``."""
+    router = APIRouter(prefix="/pfr", tags=["pfr"])
+
+    def failed(fields, body, reason):
+        inputs = {RESULT_FIELDS[field]: getattr(body, field) for field in fields}
+        return PFRResult(**inputs).did_not_converge(reason)
+
+    def solve(solver, fields, body):
+        try:
+            return compute_queue.run(solver, *(getattr(body, field) for field in fields))
+        except DidNotConverge as exc:
+            return failed(fields, body, exc)
+
+    def solve_batch(solver, fields, body):
+        if len(body) > max_batch:
+            raise HTTPException(status_code=413, detail=f"at most {max_batch} cases per request")
+        deadline = time.monotonic() + batch_timeout
+        batch = PFRBatchResult(len(body))
+        for i, item in enumerate(body):
+            if time.monotonic() > deadline:
+                batch[i] = failed(fields, item, f"batch did not finish within {batch_timeout:g} s")
+                continue
+            try:
+                batch[i] = solve(solver, fields, item)
+            except ComputeQueueFull as exc:
+                batch[i] = failed(fields, item, exc)
+        return batch
+
+    def add_endpoint(path, schema, solver, fields):
+        # Results are serialized once, straight into the response body
+        def endpoint(body: Union[schema, List[schema]], columnar: bool = False):
+            if isinstance(body, list):
+                batch = solve_batch(solver, fields, body)
+                return JSONResponse(batch.to_columns() if columnar else batch.to_records())
+            try:
+                return JSONResponse(solve(solver, fields, body).to_dict())
+            except ComputeQueueFull as exc:
+                raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+
+        endpoint.__name__ = f"pfr_{path.replace('-', '_')}"
+        endpoint.__doc__ = f"Solve one {schema.__name__}, or a list of up to {max_batch} of them in order."
+        router.post(f"/{path}")(endpoint)
+
+    for path, (schema, solver, fields) in PFR_ENDPOINTS.items():
+        add_endpoint(path, schema, solver, fields)
+
+    @router.post("/conversion-sweep")
+    def pfr_conversion_sweep_endpoint(body: PlugFlowConversionSweepInput, columnar: bool = False):
+        """Solve the conversion at each of up to ``max_batch`` volumes of one feed, in order."""
+        if len(body.volumes) > max_batch:
+            raise HTTPException(status_code=413, detail=f"at most {max_batch} volumes per request")
+        feed = (body.volumetric, body.temperature, body.pressure, body.concentrationOfA, body.concentrationOfB,
+                body.rateConstant)
+        try:
+            batch = compute_queue.run(pfr_conversion_sweep, *feed, body.volumes)
+        except ComputeQueueFull as exc:
+            raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
+        except DidNotConverge as exc:
+            batch = PFRBatchResult.from_results(
+                PFRResult(*feed, reactor_volume=V).did_not_converge(exc) for V in body.volumes
+            )
+        return JSONResponse(batch.to_columns() if columnar else batch.to_records())
+
+    return router
@@ -0,0 +1,155 @@
+"""Deterministic routing of fully specified PFR questions straight to the solver.
+
+``parse_pfr_request`` recognises the textbook phrasing of the elementary gas phase
+reaction A + B -> C in an isothermal PFR. It only returns a request when every
+parameter is stated once, in the units the solver expects, and the question asks for
+either the conversion at a given volume or the volume for a given conversion. Anything
+else, including any ambiguity, is left to the agent.
+
+Routing is by whitelist. The text has to name a PFR, the problem statement may only
+use the words of the textbook phrasing, and the question those of a fixed template.
+Anything that changes the model, such as a liquid phase, a non-elementary rate, a
+pressure drop or a what-if, or asks about another species or reactor, uses a word
+outside them and goes to the agent.
+"""
+import re
+import unicodedata
+
+from langchain_core.runnables import RunnableLambda
+
+from reactors.budget import DidNotConverge
+from reactors.pfr.molar_expansion import pfr_expansion_factor, pfr_volume_for_conversion
+from server.admission import ComputeQueueFull
+
+
+QUANTITY = re.compile(r"(?<![\w.])([-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?)\s*(%|[a-z°][\w°^/().*·-]*)?")
+REACTION = re.compile(r"(?<![\w-])elementary\b.*\ba\s*\+\s*b\s*(?:->|=>|=)\s*c\b")
+SENTENCE_END = re.compile(r"[.?!]+(?:\s+|$)")
+WORD = re.compile(r"[a-z]+")
+PFR = re.compile(r"\bpfr\b|\bplug[\s-]+flow\b")
+# Every word the problem statement may use, besides the quantities and their units.
+# Words that change the model the solver implements are deliberately missing.
+STATEMENT_WORDS = frozenset(
+    "the a an elementary gas phase reaction b c is are carried out in at of and with its "
+    "isothermal isothermally pfr plug flow reactor operated inlet feed fed initial entering "
+    "pressure temperature stream consists consisting equal concentration concentrations "
+    "volumetric flowrate rate constant each both".split()
+)
+# Every word the question may use. Species other than A, reactor types and conditions
+# are deliberately missing.
+ASK_WORDS = frozenset(
+    "what is the a an of in for to at be will conversion reactant species outlet exit "
+    "calculate compute determine find estimate pfr plug flow reactor volume needed required "
+    "reach achieve obtain get".split()
+)
+
+# Units the solver works in, as they appear after normalization
+UNITS = {
+    "k": "T",
+    "atm": "P_0",
+    "m^3/min": "v_0",
+    "m^3/(mol.min)": "k",
+    "m^3": "V",
+}
+
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    return text.replace("→", "->").replace("³", "^3").replace("·", ".").replace("m3", "m^3")
+
+
+def parse_pfr_request(text):
+    """
+    Return ``("conversion", params)`` or ``("volume", params)`` for a fully specified
+    question, or None.
+    """
+    text = _normalize(text)
+    if not REACTION.search(text) or not PFR.search(text):
+        return None
+    sentences = [sentence for sentence in SENTENCE_END.split(text) if sentence.strip()]
+    if not sentences:
+        return None
+    for sentence in sentences[:-1]:
+        if not set(WORD.findall(QUANTITY.sub(" ", sentence))) <= STATEMENT_WORDS:
+            return None
+
+    found = {}
+
+    def record(name, value):
+        # The same quantity may be repeated, but never with two different values
+        if found.setdefault(name, value) != value:
+            raise ValueError(name)
+
+    try:
+        for sentence in sentences:
+            previous_end = 0
+            for match in QUANTITY.finditer(sentence):
+                value, unit = float(match.group(1)), (match.group(2) or "").rstrip(",;:")
+                before = sentence[previous_end:match.start()]
+                previous_end = match.end()
+                if unit == "%" and "conversion" in sentence:
+                    record("X", value / 100)
+                elif unit == "mol/m^3":
+                    if "a and b" in before or "equal" in before:
+                        record("c_A0", value)
+                        record("c_B0", value)
+                    elif re.search(r"\bb\b", before):
+                        record("c_B0", value)
+                    elif re.search(r"\ba\b", before):
+                        record("c_A0", value)
+                    else:
+                        return None
+                elif unit in UNITS:
+                    record(UNITS[unit], value)
+                elif not unit and "conversion" in before and 0 < value < 1:
+                    record("X", value)
+                else:
+                    return None
+    except ValueError:
+        return None
+
+    ask = sentences[-1]
+    if not set(WORD.findall(QUANTITY.sub(" ", ask))) <= ASK_WORDS:
+        return None
+    feed = {"v_0", "T", "P_0", "c_A0", "c_B0", "k"}
+    if "volume" in ask and "conversion" in ask and found.keys() == feed | {"X"}:
+        return "volume", found
+    if "conversion" in ask and found.keys() == feed | {"V"}:
+        return "conversion", found
+    return None
+
+
+class PreRouter:
+    """Answer fully specified questions with the solver and send the rest to the agent."""
+
+    def __init__(self, compute_queue):
+        self.compute_queue = compute_queue
+
+    def answer(self, question):
+        """The solver's answer to ``question``, or None if the agent should handle it."""
+        request = parse_pfr_request(question)
+        if request is None:
+            return None
+        kind, p = request
+        try:
+            if kind == "conversion":
+                conv, prod = self.compute_queue.run(
+                    pfr_expansion_factor, p["v_0"], p["T"], p["P_0"], p["c_A0"], p["c_B0"], p["k"], p["V"]
+                )
+                return f"The conversion of A in a {p['V']:g} m^3 PFR is {conv:.4f}."
+            volume = self.compute_queue.run(
+                pfr_volume_for_conversion, p["v_0"], p["T"], p["P_0"], p["c_A0"], p["c_B0"], p["k"], p["X"]
+            )
+            return f"A PFR volume of {volume:.4g} m^3 is needed to reach a conversion of A of {p['X']:g}."
+        except (DidNotConverge, ComputeQueueFull):
+            # Let the agent explain the problem to the user
+            return None
+
+    def wrap(self, agent):
+        def route(inputs):
+            answer = self.answer(inputs["input"])
+            if answer is None:
+                return agent
+            return {"output": answer}
+
+        return RunnableLambda(route)
@@ -0,0 +1,234 @@
+"""Response cache for repeated, self-contained questions.
+
+Questions are reduced to a wording template and the numeric parameters they mention.
+Two questions are equivalent when their parameters, values with units and, where a
+unit is shared, the word naming each value, are identical
+and the cache backend judges their templates to match:
+
+* ``HashingBackend`` matches templates that contain the same words in any order.
+* ``HashedEmbeddingBackend`` requires the same content words in the problem statement,
+  since a single word such as "liquid" or "non-elementary" makes it a different
+  problem. Only the final question is embedded as feature-hashed word and character
+  trigram vectors and matched on cosine similarity, so it tolerates rewording.
+
+Both run locally without any external service. Only questions asked without prior chat
+history are cached, since a follow-up question depends on its context.
+"""
+import hashlib
+import os
+import re
+import unicodedata
+import zlib
+from collections import OrderedDict
+from itertools import count
+from threading import Lock
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+
+
+RESPONSE_CACHE_SIZE = int(os.getenv("ALCHEMY_RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("ALCHEMY_RESPONSE_CACHE_THRESHOLD", "0.9"))
+
+NUMBER = re.compile(r"(?<![\w.])([-+]?\d+(?:\.\d+)?(?:e[-+]?\d+)?)\s*([a-z°][\w°^/().*·-]*)?")
+WORD = re.compile(r"[a-z#^/]+")
+SENTENCE_END = re.compile(r"[.?!]+(?:\s+|$)")
+# Includes the usual ways of phrasing a request, so that "What is the conversion" and
+# "Calculate the conversion" ask the same thing.
+STOPWORDS = frozenset(
+    "a an and are as at be by for from given i in is it me of on or please the this to what "
+    "with you your we our can could would should calculate compute determine find estimate "
+    "how much tell".split()
+)
+# Words that cannot name a value. "a" is kept, as it is usually reactant A.
+LABEL_STOPWORDS = STOPWORDS - {"a"}
+# Solver failures reported by the tools, in either the dict or the JSON form
+NOT_CONVERGED = re.compile(r"""converged['"]?\s*:\s*(False|false)""")
+
+
+def normalize_question(text):
+    """
+    Split a question into a wording template and a sorted tuple of ``(label, value, unit)``.
+
+    ``"... 1.2 m³ PFR at 350 K ..."`` and ``"... 350 K, 1.20 m^3 PFR ..."`` give the same
+    parameters, while their templates keep the surrounding wording. A unit with a single
+    value identifies its quantity and has an empty label. Values that share a unit are
+    labelled with the word before them, such as the species in "A at 10 mol/m^3 and B at
+    20 mol/m^3", so swapping them changes the parameters. The template has one sentence
+    per line, and the last line is what is actually being asked.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = text.replace("→", "->").replace("³", "^3").replace("²", "^2")
+    found = []
+    lines = []
+    for sentence in SENTENCE_END.split(text):
+        words, previous_end = [], 0
+        for match in NUMBER.finditer(sentence):
+            value, unit = match.groups()
+            unit = (unit or "").rstrip(".,;:?)").replace("m3", "m^3").replace("·", ".")
+            before = WORD.findall(sentence[previous_end:match.start()])
+            labels = [word for word in before if word not in LABEL_STOPWORDS]
+            found.append((labels[-1] if labels else "", float(value), unit))
+            words += before + ["#"]
+            previous_end = match.end()
+        words += WORD.findall(sentence[previous_end:])
+        if words:
+            lines.append(" ".join(words))
+
+    values = {}
+    for _, value, unit in found:
+        values.setdefault(unit, set()).add(value)
+    params = set()
+    for i, (label, value, unit) in enumerate(found):
+        if len(values[unit]) == 1:
+            params.add(("", value, unit))
+        else:
+            # Nothing names the value, so fall back to its position
+            params.add((label or f"#{i}", value, unit))
+    return "\n".join(lines), tuple(sorted(params))
+
+
+def _split_template(template):
+    """The problem statement and the request, as lists of content words."""
+    context, _, ask = template.rpartition("\n")
+    return (
+        [word for word in WORD.findall(context) if word not in STOPWORDS],
+        [word for word in WORD.findall(ask) if word not in STOPWORDS],
+    )
+
+
+def _statement_key(words):
+    return hashlib.sha1(" ".join(sorted(set(words))).encode()).digest()
+
+
+class HashingBackend:
+    """Exact match on the content words of the problem statement and of the request."""
+
+    def embed(self, template):
+        context, ask = _split_template(template)
+        return _statement_key(context), _statement_key(ask)
+
+    def match(self, a, b):
+        return a == b
+
+
+class HashedEmbeddingBackend:
+    """
+    Exact match on the content words of the problem statement, and cosine similarity
+    between feature-hashed bag-of-words and character trigram vectors of the request.
+    """
+
+    def __init__(self, dim=1024, threshold=RESPONSE_CACHE_THRESHOLD):
+        self.dim = dim
+        self.threshold = threshold
+
+    def embed(self, template):
+        context, ask = _split_template(template)
+        return _statement_key(context), self._vector(ask)
+
+    def match(self, a, b):
+        (context_a, ask_a), (context_b, ask_b) = a, b
+        if context_a != context_b:
+            return False
+        return float(ask_a @ ask_b) >= self.threshold or not (ask_a.any() or ask_b.any())
+
+    def _vector(self, words):
+        vector = np.zeros(self.dim)
+        features = words + [w[i:i + 3] for w in words for i in range(max(len(w) - 2, 1))]
+        for feature in features:
+            h = zlib.crc32(feature.encode())
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class ResponseCache:
+    """Bounded LRU of agent answers keyed by normalized question."""
+
+    def __init__(self, backend=None, max_entries=RESPONSE_CACHE_SIZE):
+        self.backend = backend or HashedEmbeddingBackend()
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (params, n) -> (embedding, answer)
+        self._buckets = {}  # params -> keys of the entries with those parameters
+        self._ids = count()
+        self._lock = Lock()
+
+    def get(self, question):
+        template, params = normalize_question(question)
+        embedding = self.backend.embed(template)
+        with self._lock:
+            for key in self._buckets.get(params, ()):
+                cached_embedding, answer = self._entries[key]
+                if self.backend.match(embedding, cached_embedding):
+                    self._entries.move_to_end(key)
+                    return answer
+        return None
+
+    def put(self, question, answer):
+        template, params = normalize_question(question)
+        embedding = self.backend.embed(template)
+        with self._lock:
+            key = (params, next(self._ids))
+            self._entries[key] = (embedding, answer)
+            self._buckets.setdefault(params, []).append(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                bucket = self._buckets[old_key[0]]
+                bucket.remove(old_key)
+                if not bucket:
+                    del self._buckets[old_key[0]]
+
+    def wrap(self, agent):
+        """
+        Put the cache in front of an agent that takes ``input`` and ``chat_history``.
+
+        Misses stream through the agent unchanged. The answer is stored once the run
+        finishes, unless a solver call in it did not converge.
+        """
+
+        def route(inputs):
+            if inputs.get("chat_history"):
+                return agent
+            question = inputs["input"]
+            answer = self.get(question)
+            if answer is not None:
+                return {"output": answer}
+
+            watcher = _SolveFailureWatcher()
+
+            def remember(final):
+                if not watcher.failed and isinstance(final, dict) and "output" in final:
+                    self.put(question, final["output"])
+
+            def transform(chunks):
+                final = None
+                for chunk in chunks:
+                    final = chunk if final is None else final + chunk
+                    yield chunk
+                remember(final)
+
+            async def atransform(chunks):
+                final = None
+                async for chunk in chunks:
+                    final = chunk if final is None else final + chunk
+                    yield chunk
+                remember(final)
+
+            return agent.with_config(callbacks=[watcher]) | RunnableGenerator(transform, atransform)
+
+        return RunnableLambda(route)
+
+
+class _SolveFailureWatcher(BaseCallbackHandler):
+    """Flags a run whose tools failed, so that its answer is not cached."""
+
+    def __init__(self):
+        self.failed = False
+
+    def on_tool_end(self, output, **kwargs):
+        if NOT_CONVERGED.search(str(output)):
+            self.failed = True
+
+    def on_tool_error(self, error, **kwargs):
+        self.failed = True
@@ -0,0 +1,246 @@
+"""Caches for PFR solver results.
+
+``pfr_expansion_factor`` looks its parameters up in the cache installed with
+``reactors.pfr.molar_expansion.set_result_cache``. Two backends are available:
+
+* ``LocalResultCache`` is an LRU dict private to one process.
+* ``SharedResultCache`` is a fixed-size open-addressing table in a memory-mapped file,
+  by default under /dev/shm, that every worker process on the host maps. A result solved
+  by one worker is a hit for all of them.
+
+The file outlives the server, so it is tied to the solver's ``RESULT_VERSION`` both in
+its default name and in its header, and results from another version are never read.
+The default name also carries the user id, so deployments run by different users do
+not collide. A file of another shape or version is replaced by a new one rather than
+resized, since workers that still map the old file would crash on a shrunk mapping.
+
+Layout of the shared table: a header followed by ``slots`` fixed-size slots::
+
+    seq u64 | key hash u64 | written at f64 | key KEY_LEN x f64 | value VALUE_LEN x f64
+
+Reads take no lock. Each slot is guarded by a sequence number that a writer makes odd
+while it writes and even again when done, and a reader only accepts a slot whose
+sequence number was the same even value before and after copying it. Writes are rare,
+only on misses, and are serialized across processes with ``lockf``. A key is probed in
+``PROBE_LIMIT`` consecutive slots. When they are all taken the oldest entry among them
+is evicted. ``lockf`` is POSIX only, so elsewhere ``result_cache_from_env`` falls back
+to a local cache.
+"""
+import getpass
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from reactors.pfr.molar_expansion import RESULT_VERSION
+
+
+RESULT_CACHE = os.getenv("ALCHEMY_RESULT_CACHE", "shared")
+RESULT_CACHE_SLOTS = int(os.getenv("ALCHEMY_RESULT_CACHE_SLOTS", "65536"))
+# getuid is POSIX only
+_USER = os.getuid() if hasattr(os, "getuid") else getpass.getuser()
+RESULT_CACHE_PATH = os.getenv(
+    "ALCHEMY_RESULT_CACHE_PATH",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        f"alchemy-pfr-results-{_USER}-v{RESULT_VERSION}",
+    ),
+)
+
+# pfr_expansion_factor(v_0, T, P_0, c_A0, c_B0, k, V, a, b, c, d) -> (conversion, production)
+KEY_LEN = 11
+VALUE_LEN = 2
+PROBE_LIMIT = 8
+SIGNIFICANT_DIGITS = 12
+
+MAGIC = b"ALCPFR02"
+HEADER = struct.Struct("<8sQQQQ")  # magic, solver result version, slots, key length, value length
+SLOT = struct.Struct(f"<QQd{KEY_LEN}d{VALUE_LEN}d")
+SEQ = struct.Struct("<Q")
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(values):
+    """Round parameters so that values differing only by float noise share an entry."""
+    return tuple(float(f"{float(value):.{SIGNIFICANT_DIGITS}g}") for value in values)
+
+
+class LocalResultCache:
+    """Per-process LRU cache of solver results."""
+
+    def __init__(self, max_entries=RESULT_CACHE_SLOTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        key = normalize_key(key)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        key = normalize_key(key)
+        with self._lock:
+            self._entries[key] = tuple(float(v) for v in value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SharedResultCache:
+    """Solver results shared by every process that maps the same file."""
+
+    def __init__(self, path=RESULT_CACHE_PATH, slots=RESULT_CACHE_SLOTS, version=RESULT_VERSION):
+        # Raises ImportError off POSIX, before the file is touched
+        import fcntl
+
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        self.version = version
+        self._header = HEADER.pack(MAGIC, version, slots, KEY_LEN, VALUE_LEN)
+        size = HEADER.size + slots * SLOT.size
+        self._lock_pid = None
+        while True:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            with self._locked():
+                if not _same_file(self._fd, path):
+                    pass  # replaced while we waited for the lock
+                elif os.fstat(self._fd).st_size == 0:
+                    os.ftruncate(self._fd, size)
+                    os.pwrite(self._fd, self._header, 0)
+                    break
+                elif os.fstat(self._fd).st_size == size and self._header_matches():
+                    break
+                else:
+                    # Another shape or version. Workers may still map this file, so
+                    # it is swapped for a new one instead of being resized under them.
+                    self._replace(size)
+            os.close(self._fd)
+        self._map = mmap.mmap(self._fd, size)
+
+    def get(self, key):
+        key = normalize_key(key)
+        key_hash = _hash(key)
+        for offset in self._probe(key_hash):
+            seq = SEQ.unpack_from(self._map, offset)[0]
+            if seq & 1:
+                continue  # being written
+            fields = SLOT.unpack_from(self._map, offset)
+            if SEQ.unpack_from(self._map, offset)[0] != seq:
+                continue  # changed while we read it
+            if fields[1] == 0:
+                return None  # empty slot ends the probe sequence
+            if fields[1] == key_hash and fields[3:3 + KEY_LEN] == key:
+                return fields[3 + KEY_LEN:]
+        return None
+
+    def put(self, key, value):
+        key = normalize_key(key)
+        key_hash = _hash(key)
+        with self._locked():
+            target, oldest = None, math.inf
+            for offset in self._probe(key_hash):
+                fields = SLOT.unpack_from(self._map, offset)
+                slot_hash, written_at = fields[1], fields[2]
+                if slot_hash == 0 or (slot_hash == key_hash and fields[3:3 + KEY_LEN] == key):
+                    target = offset
+                    break
+                if written_at < oldest:
+                    target, oldest = offset, written_at
+            seq = SEQ.unpack_from(self._map, target)[0]
+            SEQ.pack_into(self._map, target, seq + 1)
+            SLOT.pack_into(self._map, target, seq + 1, key_hash, time.time(), *key, *(float(v) for v in value))
+            SEQ.pack_into(self._map, target, seq + 2)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _probe(self, key_hash):
+        start = key_hash % self.slots
+        for i in range(min(PROBE_LIMIT, self.slots)):
+            yield HEADER.size + ((start + i) % self.slots) * SLOT.size
+
+    def _header_matches(self):
+        return os.pread(self._fd, HEADER.size, 0) == self._header
+
+    def _replace(self, size):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=os.path.basename(self.path))
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, self._header, 0)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        finally:
+            os.close(fd)
+
+    def _locked(self):
+        # lockf locks belong to the process, so they exclude other workers, forked ones
+        # included, but not other threads of this one, which a thread lock keeps apart.
+        # A worker forked while the lock was held starts with a fresh thread lock.
+        if self._lock_pid != os.getpid():
+            self._lock_pid = os.getpid()
+            self._thread_lock = Lock()
+        return _FileLock(self._fcntl, self._fd, self._thread_lock)
+
+
+class _FileLock:
+    def __init__(self, fcntl, fd, thread_lock):
+        self.fcntl = fcntl
+        self.fd = fd
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            self.fcntl.lockf(self.fd, self.fcntl.LOCK_EX)
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.fcntl.lockf(self.fd, self.fcntl.LOCK_UN)
+        finally:
+            self.thread_lock.release()
+        return False
+
+
+def _same_file(fd, path):
+    try:
+        return os.path.samestat(os.fstat(fd), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+def _hash(key):
+    # Zero marks an empty slot, so it is never a valid hash. Only zero itself is remapped,
+    # since forcing a bit would leave half of the probe starts unused.
+    key_hash = int.from_bytes(hashlib.blake2b(struct.pack(f"<{KEY_LEN}d", *key), digest_size=8).digest(), "little")
+    return key_hash or 1
+
+
+def result_cache_from_env():
+    """The cache selected by ``ALCHEMY_RESULT_CACHE``: shared (default), local or off."""
+    if RESULT_CACHE == "shared":
+        try:
+            return SharedResultCache()
+        except (ImportError, OSError):
+            logger.exception("Cannot map the shared result cache at %s, using a local one", RESULT_CACHE_PATH)
+            return LocalResultCache()
+    if RESULT_CACHE == "local":
+        return LocalResultCache()
+    return None
@@ -0,0 +1,213 @@
+"""Server-side chat sessions.
+
+Clients send only the new message and a session id; the history lives here. Sessions
+are bounded in number and length and are evicted least-recently-used first or once they
+have been idle longer than the TTL.
+
+Once a session grows past ``max_messages`` its oldest messages are handed to the
+``compactor``, usually ``HistoryTrimmer.compact``, which folds them into the session's
+rolling summary message. Without a compactor they are dropped.
+
+``SessionStore`` keeps everything in memory and is lost on restart. ``SQLiteSessionStore``
+keeps the same data in a local SQLite file so that sessions survive restarts and are
+shared by every worker on the host.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+
+MAX_SESSIONS = int(os.getenv("ALCHEMY_MAX_SESSIONS", "1000"))
+SESSION_TTL = float(os.getenv("ALCHEMY_SESSION_TTL", str(24 * 60 * 60)))
+MAX_SESSION_MESSAGES = int(os.getenv("ALCHEMY_MAX_SESSION_MESSAGES", "200"))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionHistory(BaseChatMessageHistory):
+    """The history of one session, as seen by ``RunnableWithMessageHistory``."""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self):
+        return self.store.get(self.session_id)
+
+    def add_messages(self, messages):
+        self.store.append(self.session_id, messages)
+
+    def clear(self):
+        self.store.delete(self.session_id)
+
+
+class SessionStore:
+    """In-memory session store with LRU and TTL eviction."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, max_messages=MAX_SESSION_MESSAGES,
+                 compactor=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.compactor = compactor
+        self._sessions = OrderedDict()
+        self._lock = Lock()
+
+    def history(self, session_id):
+        """Factory for ``RunnableWithMessageHistory``."""
+        return SessionHistory(self, session_id)
+
+    def get(self, session_id):
+        with self._lock:
+            self._expire()
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return []
+            self._sessions[session_id] = (time.monotonic(), entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id, messages):
+        with self._lock:
+            _, history = self._sessions.pop(session_id, (None, []))
+            history = history + list(messages)
+            self._sessions[session_id] = (time.monotonic(), history)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if len(history) <= self.max_messages:
+            return
+        # Summarizing may call the LLM, so it runs outside the lock
+        compacted = _compact(self.compactor, history, self.max_messages)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry[1][:len(history)] == history:
+                self._sessions[session_id] = (entry[0], compacted + entry[1][len(history):])
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+class SQLiteSessionStore:
+    """Session store backed by a local SQLite file, with the same limits as ``SessionStore``."""
+
+    def __init__(self, path, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, max_messages=MAX_SESSION_MESSAGES,
+                 compactor=None):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.compactor = compactor
+        self._lock = Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, last_used REAL NOT NULL, messages TEXT NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+
+    def history(self, session_id):
+        """Factory for ``RunnableWithMessageHistory``."""
+        return SessionHistory(self, session_id)
+
+    def get(self, session_id):
+        with self._lock, self._connect() as db:
+            self._expire(db)
+            row = db.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return []
+            db.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (time.time(), session_id))
+            return messages_from_dict(json.loads(row[0]))
+
+    def append(self, session_id, messages):
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            history = json.loads(row[0]) if row else []
+            history = history + messages_to_dict(messages)
+            self._write(db, session_id, history)
+            db.execute(
+                "DELETE FROM sessions WHERE session_id NOT IN "
+                "(SELECT session_id FROM sessions ORDER BY last_used DESC LIMIT ?)",
+                (self.max_sessions,),
+            )
+        if len(history) <= self.max_messages:
+            return
+        # Summarizing may call the LLM, so it runs outside the lock and the transaction
+        compacted = messages_to_dict(_compact(self.compactor, messages_from_dict(history), self.max_messages))
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            current = json.loads(row[0]) if row else None
+            if current is not None and current[:len(history)] == history:
+                self._write(db, session_id, compacted + current[len(history):])
+
+    def _write(self, db, session_id, history):
+        db.execute(
+            "INSERT OR REPLACE INTO sessions (session_id, last_used, messages) VALUES (?, ?, ?)",
+            (session_id, time.time(), json.dumps(history)),
+        )
+
+    def delete(self, session_id):
+        with self._lock, self._connect() as db:
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _expire(self, db):
+        db.execute("DELETE FROM sessions WHERE last_used < ?", (time.time() - self.ttl,))
+
+    def _connect(self):
+        return _Connection(self.path)
+
+
+class _Connection:
+    """Context manager that commits and closes, unlike ``sqlite3.Connection`` which only commits."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, timeout=30)
+
+    def __enter__(self):
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.db.commit()
+            else:
+                self.db.rollback()
+        finally:
+            self.db.close()
+        return False
+
+
+def _compact(compactor, history, max_messages):
+    """``history`` cut down to ``max_messages``, through ``compactor`` when there is one."""
+    evict = len(history) - max_messages
+    if compactor is not None:
+        try:
+            return list(compactor(history, evict))
+        except Exception:
+            logger.exception("Could not summarize the oldest session messages, dropping them")
+    return history[evict:]
+
+
+def session_store_from_env(compactor=None):
+    """SQLite store when ``ALCHEMY_SESSION_DB`` is set, in-memory store otherwise."""
+    path = os.getenv("ALCHEMY_SESSION_DB")
+    if path:
+        return SQLiteSessionStore(path, compactor=compactor)
+    return SessionStore(compactor=compactor)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from reactors.budget import SolveBudget, SolveBudgetExceeded
+from server.admission import AdmissionMiddleware, ComputeQueue, ComputeQueueFull
+
+
+def test_budget_counts_steps():
+    budget = SolveBudget(max_steps=3)
+    for _ in range(3):
+        budget.charge()
+    with pytest.raises(SolveBudgetExceeded, match="step budget"):
+        budget.charge()
+
+
+def test_budget_runs_out_of_time():
+    budget = SolveBudget(max_time=0)
+    time.sleep(0.01)
+    with pytest.raises(SolveBudgetExceeded, match="time budget"):
+        budget.charge()
+
+
+def test_cancelled_budget_stops_the_next_charge():
+    budget = SolveBudget()
+    budget.charge()
+    budget.cancel()
+    with pytest.raises(SolveBudgetExceeded, match="cancelled"):
+        budget.charge()
+
+
+def spin(started=None, budget=None):
+    """A solve that only ends when its budget does."""
+    if started is not None:
+        started.set()
+    while True:
+        budget.charge()
+        time.sleep(0.001)
+
+
+def test_queue_passes_a_budget_and_returns_the_result():
+    queue = ComputeQueue(workers=1, max_queued=0, timeout=5)
+    assert queue.run(lambda x, budget: (x, isinstance(budget, SolveBudget)), 2) == (2, True)
+
+
+def test_full_queue_rejects_without_waiting():
+    queue = ComputeQueue(workers=1, max_queued=0, timeout=5)
+    started = threading.Event()
+    budget = SolveBudget()
+    blocker = threading.Thread(target=lambda: pytest.raises(SolveBudgetExceeded, queue.run, spin, started,
+                                                            budget=budget))
+    blocker.start()
+    started.wait(5)
+    try:
+        with pytest.raises(ComputeQueueFull):
+            queue.run(lambda budget: None)
+    finally:
+        budget.cancel()
+        blocker.join(5)
+
+
+def test_timeout_cancels_the_solve_and_frees_its_slot():
+    queue = ComputeQueue(workers=1, max_queued=0, timeout=0.1)
+    with pytest.raises(SolveBudgetExceeded):
+        queue.run(spin)
+    # The slot comes back once the cancelled solve notices
+    time.sleep(0.1)
+    assert queue.run(lambda budget: "free") == "free"
+
+
+def test_timeout_of_a_queued_solve_keeps_it_from_starting():
+    queue = ComputeQueue(workers=1, max_queued=1, timeout=0.2)
+    queued_started = threading.Event()
+    # Ignores its budget, so it holds the only worker past the queued solve's timeout
+    running = threading.Thread(target=lambda: pytest.raises(SolveBudgetExceeded, queue.run,
+                                                            lambda budget: time.sleep(0.6)))
+    running.start()
+    time.sleep(0.05)
+    with pytest.raises(SolveBudgetExceeded):
+        queue.run(lambda budget: queued_started.set())
+    running.join(5)
+    assert not queued_started.wait(0.2)
+    assert queue.run(lambda budget: "free") == "free"
+
+
+def test_admission_rejects_with_retry_after_once_the_wait_queue_is_full():
+    release = threading.Event()
+    app = FastAPI()
+
+    @app.post("/invoke")
+    def invoke():
+        release.wait(5)
+        return {"output": "done"}
+
+    app.add_middleware(AdmissionMiddleware, max_concurrent=1, max_queued=0, queue_timeout=2)
+    client = TestClient(app)
+    first = threading.Thread(target=client.post, args=("/invoke",))
+    first.start()
+    time.sleep(0.2)
+    try:
+        response = client.post("/invoke")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "2"
+    finally:
+        release.set()
+        first.join(5)
+    assert client.post("/invoke").status_code == 200
@@ -0,0 +1,105 @@
+import re
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from server.history import HistoryTrimmer
+from server.sessions import SessionStore
+
+
+class FakeSummarizer:
+    """Summarizes by keeping every ``fact-N`` it is shown, and records its prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, text, config=None):
+        self.prompts.append(text)
+        facts = sorted(set(re.findall(r"fact-\d+", text)), key=lambda fact: int(fact[5:]))
+        return AIMessage(content=" ".join(facts))
+
+
+def converse(max_messages, turns=100):
+    """Run ``turns`` turns through a trimmed session, returning the summarizer, trimmer and store."""
+    llm = FakeSummarizer()
+    # An unknown encoding falls back to the character estimate, without a download
+    trimmer = HistoryTrimmer(llm, budget=400, encoding="unavailable")
+    store = SessionStore(max_messages=max_messages, compactor=trimmer.compact)
+    for turn in range(turns):
+        trimmer(store.get("s"))
+        store.append("s", [
+            HumanMessage(content=f"Question {turn} about fact-{turn}. " + "detail " * 20),
+            AIMessage(content=f"Answer {turn}. " + "result " * 20),
+        ])
+    return llm, trimmer, store
+
+
+def test_trimmer_keeps_its_summary_across_a_capped_session():
+    capped_llm, trimmer, store = converse(max_messages=20)
+    uncapped_llm, _, _ = converse(max_messages=10 ** 6)
+
+    assert len(store.get("s")) <= 20
+    # Capping the session costs no extra summarizer calls and no bigger prompts
+    assert len(capped_llm.prompts) == len(uncapped_llm.prompts)
+    assert max(map(len, capped_llm.prompts)) == max(map(len, uncapped_llm.prompts))
+    # Nothing evicted from the session is lost from the summary
+    summary = trimmer(store.get("s"))[0].content
+    assert "fact-0 " in summary and "fact-90 " in summary
+
+
+def test_session_without_compactor_drops_oldest_messages():
+    store = SessionStore(max_messages=4)
+    for turn in range(5):
+        store.append("s", [HumanMessage(content=str(turn)), AIMessage(content=str(turn))])
+    assert [message.content for message in store.get("s")] == ["3", "3", "4", "4"]
+
+
+def turns(count, start=0):
+    messages = []
+    for turn in range(start, start + count):
+        messages += [
+            HumanMessage(content=f"Question {turn} about fact-{turn}. " + "detail " * 20),
+            AIMessage(content=f"Answer {turn}. " + "result " * 20),
+        ]
+    return messages
+
+
+def test_history_within_budget_is_passed_through():
+    llm = FakeSummarizer()
+    trimmer = HistoryTrimmer(llm, budget=10 ** 6, encoding="unavailable")
+    assert trimmer(turns(3)) == turns(3)
+    assert llm.prompts == []
+
+
+def test_history_over_budget_is_summarized_once_and_reused():
+    llm = FakeSummarizer()
+    trimmer = HistoryTrimmer(llm, budget=400, encoding="unavailable")
+    history = turns(6)
+
+    trimmed = trimmer(history)
+    assert len(llm.prompts) == 1
+    assert isinstance(trimmed[0], SystemMessage) and "fact-0" in trimmed[0].content
+    assert trimmed[1:] == history[len(history) - len(trimmed) + 1:]
+    assert isinstance(trimmed[1], HumanMessage)
+    assert sum(trimmer.count_tokens(message) for message in trimmed) <= 400
+
+    # The next turn still fits behind the cached summary
+    assert trimmer(history + turns(1, start=6))[0] == trimmed[0]
+    assert len(llm.prompts) == 1
+
+
+def test_summary_is_extended_rather_than_rebuilt():
+    llm = FakeSummarizer()
+    trimmer = HistoryTrimmer(llm, budget=400, encoding="unavailable")
+    trimmer(turns(6))
+    trimmer(turns(12))
+    assert len(llm.prompts) == 2
+    assert "Summary so far" in llm.prompts[1]
+    assert "Question 0 " not in llm.prompts[1]
+
+
+def test_oversized_latest_message_is_kept_verbatim():
+    llm = FakeSummarizer()
+    trimmer = HistoryTrimmer(llm, budget=10, encoding="unavailable")
+    message = HumanMessage(content="word " * 100)
+    assert trimmer([message]) == [message]
+    assert llm.prompts == []
@@ -0,0 +1,102 @@
+from reactors.budget import DidNotConverge, SolveBudget
+from reactors.pfr.checkpoints import CheckpointStore
+import pytest
+
+from reactors.pfr.molar_expansion import (
+    pfr_conversion, pfr_conversion_sweep, pfr_expansion_factor, pfr_expansion_temperature_conversion,
+    pfr_volume_for_conversion, set_checkpoint_store
+)
+
+FEED = (0.01, 350, 1, 10, 10, 0.0302)
+
+
+def test_non_physical_temperature_does_not_converge():
+    # No positive temperature reaches X=0.9 in 1.2 m^3; fsolve finds T=-1623 K
+    v_0, T, P_0, c_A0, c_B0, k = FEED
+    result = pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, 1.2, 0.9)
+    assert not result.converged
+    assert result.temperature is None
+    assert "not physical" in result.reason
+
+
+def test_physical_temperature_converges():
+    v_0, T, P_0, c_A0, c_B0, k = FEED
+    result = pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, 1.2, 0.98)
+    assert result.converged
+    assert result.temperature > 0
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("feed", [
+    (0.01, 350, 0, 10, 10, 0.0302),  # zero pressure
+    (0.01, 350, 1, 0, 10, 0.0302),  # no A in the feed
+    (0, 350, 1, 10, 10, 0.0302),  # no flow
+])
+def test_numeric_failures_are_reported_as_not_converged(feed):
+    result = pfr_conversion(*feed, 1.2)
+    assert not result.converged
+    assert result.conversion is None
+    sweep = pfr_conversion_sweep(*feed, [0.6, 1.2])
+    assert not sweep.converged.any()
+
+
+def test_checkpointed_conversions_match_direct_solves():
+    volumes = [0.05 * i for i in range(1, 41)]
+    direct = [pfr_expansion_factor(*FEED, V)[0] for V in volumes]
+    set_checkpoint_store(CheckpointStore())
+    try:
+        budget = SolveBudget()
+        sweep = pfr_conversion_sweep(*FEED, volumes, budget=budget)
+        # Queries below the furthest solved volume are interpolated
+        checkpointed = [pfr_expansion_factor(*FEED, V)[0] for V in reversed(volumes)][::-1]
+    finally:
+        set_checkpoint_store(None)
+
+    assert sweep.converged.all()
+    assert max(abs(x - y) for x, y in zip(sweep.columns["conversion"], direct)) < 2e-5
+    assert max(abs(x - y) for x, y in zip(checkpointed, direct)) < 2e-5
+    # One integration for the whole sweep, far fewer steps than a solve per volume
+    single = SolveBudget()
+    pfr_expansion_factor(*FEED, volumes[-1], budget=single)
+    assert budget.steps <= 2 * single.steps
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_checkpoint_recovers_when_continuing_fails():
+    # With half-order kinetics A runs out near V=9. Neither the 1.5x overshoot to 13.5
+    # nor continuing from the depleted state integrates, but a solve from the inlet does.
+    direct = pfr_expansion_factor(*FEED, 9.5, 0.5, 0.5)
+    set_checkpoint_store(CheckpointStore())
+    try:
+        pfr_expansion_factor(*FEED, 9, 0.5, 0.5)
+        assert pfr_expansion_factor(*FEED, 9.5, 0.5, 0.5) == pytest.approx(direct)
+        assert pfr_expansion_factor(*FEED, 9.2, 0.5, 0.5) == pytest.approx(direct)
+    finally:
+        set_checkpoint_store(None)
+
+
+def test_temperature_searches_leave_the_checkpoint_store_alone():
+    v_0, T, P_0, c_A0, c_B0, k = FEED
+    store = CheckpointStore()
+    set_checkpoint_store(store)
+    try:
+        pfr_expansion_factor(*FEED, 1.2)
+        pfr_expansion_temperature_conversion(v_0, P_0, c_A0, c_B0, k, 1.2, 0.98)
+    finally:
+        set_checkpoint_store(None)
+    assert len(store) == 1
+
+
+def test_volume_search_costs_about_one_integration():
+    budget = SolveBudget()
+    V = pfr_volume_for_conversion(*FEED, 0.9, budget=budget)
+    assert pfr_expansion_factor(*FEED, V)[0] == pytest.approx(0.9, abs=1e-5)
+    single = SolveBudget()
+    pfr_expansion_factor(*FEED, 1.0, budget=single)
+    assert budget.steps <= 2 * single.steps
+
+
+def test_unreachable_conversion_does_not_converge():
+    # B is the limiting reactant, so A's conversion cannot pass 0.5
+    with pytest.raises(DidNotConverge):
+        pfr_volume_for_conversion(0.01, 350, 1, 10, 5, 0.0302, 0.9)
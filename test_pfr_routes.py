@@ -0,0 +1,94 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from reactors.pfr.results import PFRResult
+from server.admission import ComputeQueueFull
+from server.pfr_routes import pfr_router
+
+CASE = {
+    "volumetric": 0.01, "temperature": 350, "pressure": 1, "concentrationOfA": 10, "concentrationOfB": 10,
+    "rateConstant": 0.0302, "volume": 1.2,
+}
+
+
+class SaturatedQueue:
+    """Runs solves inline, except the ``full``-th ones, which find the queue full."""
+
+    def __init__(self, full=()):
+        self.full = set(full)
+        self.calls = 0
+
+    def run(self, fn, *args):
+        self.calls += 1
+        if self.calls - 1 in self.full:
+            raise ComputeQueueFull("the solver is saturated, try again shortly")
+        return fn(*args)
+
+
+def client(queue, **kwargs):
+    app = FastAPI()
+    app.include_router(pfr_router(queue, **kwargs))
+    return TestClient(app)
+
+
+def test_batch_over_the_cap_is_rejected():
+    queue = SaturatedQueue()
+    response = client(queue, max_batch=3).post("/pfr/conversion", json=[CASE] * 4)
+    assert response.status_code == 413
+    assert queue.calls == 0
+
+
+def test_saturated_batch_item_is_a_failed_row():
+    response = client(SaturatedQueue(full={1})).post("/pfr/conversion", json=[CASE] * 3)
+    assert response.status_code == 200
+    rows = response.json()
+    assert [row.get("converged", True) for row in rows] == [True, False, True]
+    assert "saturated" in rows[1]["reason"]
+    assert rows[0]["conversion"] == rows[2]["conversion"]
+
+
+def test_saturated_single_case_is_a_503():
+    response = client(SaturatedQueue(full={0})).post("/pfr/conversion", json=CASE)
+    assert response.status_code == 503
+
+
+def test_conversion_sweep():
+    sweep = {key: value for key, value in CASE.items() if key != "volume"}
+    sweep["volumes"] = [0.6, 1.2, -1]
+    response = client(SaturatedQueue()).post("/pfr/conversion-sweep", json=sweep, params={"columnar": True})
+    assert response.status_code == 200
+    columns = response.json()
+    assert columns["reactor_volume"] == [0.6, 1.2, -1]
+    assert columns["converged"] == [True, True, False]
+    assert abs(columns["conversion"][1] - 0.98546) < 1e-4
+    too_long = dict(sweep, volumes=[1.0] * 4)
+    assert client(SaturatedQueue(), max_batch=3).post("/pfr/conversion-sweep", json=too_long).status_code == 413
+
+
+def test_non_positive_inputs_are_rejected_by_the_schema():
+    response = client(SaturatedQueue()).post("/pfr/conversion", json=[CASE, dict(CASE, pressure=0)])
+    assert response.status_code == 422
+
+
+def test_volume_for_conversion():
+    body = {key: value for key, value in CASE.items() if key != "volume"}
+    response = client(SaturatedQueue()).post("/pfr/volume-conversion", json=dict(body, conversion=0.9))
+    assert response.status_code == 200
+    result = response.json()
+    assert result.get("converged", True)
+    assert abs(result["reactor_volume"] - 0.18507) < 1e-4
+
+    response = client(SaturatedQueue()).post("/pfr/volume-production", json=dict(body, production=0.09))
+    assert abs(response.json()["reactor_volume"] - 0.18507) < 1e-4
+
+
+def test_agent_tools_return_the_rest_format():
+    import main
+
+    arguments = {"v_0": 0.01, "T": 350, "P_0": 1, "c_A0": 10, "c_B0": 10, "k": 0.0302, "a": 1, "b": 1, "c": 1, "d": 1}
+    rest = client(SaturatedQueue()).post("/pfr/conversion", json=CASE).json()
+    assert main.pfr_conversion.invoke(dict(arguments, V=1.2)) == rest
+
+    failed = main.pfr_expansion_volume_conversion.invoke(dict(arguments, X=1.5))
+    assert failed["converged"] is False
+    assert PFRResult.from_dict(failed).to_dict() == failed
@@ -0,0 +1,50 @@
+import pytest
+
+from server.prerouter import parse_pfr_request
+
+# The question in remote_runnable.py
+QUESTION = (
+    "The elementary gas phase reaction A+B → C is carried out in a 1.2 m^3 PFR at 1 atm and 350 K. "
+    "The inlet is at 1 atm and a temperature of 350 K. The stream consists of A and B with equal "
+    "concentrations of 10 mol/m^3 at a volumetric flowrate of 0.01 m^3/min. The rate constant is "
+    "0.0302 m^3/(mol.min). What is the conversion of reactant A?"
+)
+FEED = {"v_0": 0.01, "T": 350.0, "P_0": 1.0, "c_A0": 10.0, "c_B0": 10.0, "k": 0.0302}
+
+
+def test_remote_runnable_question_is_routed():
+    assert parse_pfr_request(QUESTION) == ("conversion", {**FEED, "V": 1.2})
+
+
+def test_volume_question_is_routed():
+    question = QUESTION.replace("in a 1.2 m^3 PFR", "in a PFR").replace(
+        "What is the conversion of reactant A?", "What PFR volume is needed to reach a conversion of 0.9?"
+    )
+    assert parse_pfr_request(question) == ("volume", {**FEED, "X": 0.9})
+
+
+@pytest.mark.parametrize("question", [
+    # Another reactor type
+    QUESTION.replace("1.2 m^3 PFR", "1.2 m^3 CSTR"),
+    QUESTION.replace("What is the conversion of reactant A?", "What is the conversion in a 1.2 m^3 CSTR?"),
+    # Another species
+    QUESTION.replace(
+        "A and B with equal concentrations of 10 mol/m^3", "A at 10 mol/m^3 and B at 20 mol/m^3"
+    ).replace("conversion of reactant A", "conversion of B"),
+    QUESTION.replace("conversion of reactant A", "conversion of B"),
+    # Conditions other than the stated ones
+    QUESTION.replace("reactant A?", "reactant A if the temperature is doubled?"),
+    QUESTION.replace("reactant A?", "reactant A if the pressure is halved?"),
+    QUESTION.replace("What is", "Suppose the flowrate doubles. What is"),
+    QUESTION.replace("reactant A?", "reactant A with twice the volume?"),
+    # Another physical model
+    QUESTION.replace("The elementary", "The non-elementary"),
+    QUESTION.replace("gas phase", "liquid phase"),
+    QUESTION.replace("1.2 m^3 PFR", "1.2 m^3 PFR with a pressure drop"),
+    QUESTION.replace("is carried out", "is carried out adiabatically"),
+    QUESTION.replace("reaction A+B → C", "reversible reaction A+B → C"),
+    QUESTION.replace("The rate constant", "The equilibrium constant is 4. The rate constant"),
+    QUESTION.replace("at a volumetric", "with 50% inerts at a volumetric"),
+])
+def test_questions_the_solver_cannot_answer_go_to_the_agent(question):
+    assert parse_pfr_request(question) is None
@@ -0,0 +1,43 @@
+import pytest
+
+from server.response_cache import HashedEmbeddingBackend, HashingBackend, ResponseCache, normalize_question
+
+QUESTION = (
+    "The elementary gas phase reaction A+B → C is carried out in a 1.2 m^3 PFR at 1 atm and 350 K. "
+    "The stream consists of A at {c_A0} mol/m^3 and B at {c_B0} mol/m^3 at a volumetric flowrate of "
+    "0.01 m^3/min. The rate constant is 0.0302 m^3/(mol.min). What is the conversion of reactant A?"
+)
+
+
+@pytest.mark.parametrize("backend", [HashingBackend, HashedEmbeddingBackend])
+def test_swapped_values_with_the_same_unit_miss(backend):
+    cache = ResponseCache(backend())
+    cache.put(QUESTION.format(c_A0=20, c_B0=10), "answer for c_A0=20, c_B0=10")
+    assert cache.get(QUESTION.format(c_A0=10, c_B0=20)) is None
+    assert cache.get(QUESTION.format(c_A0=20, c_B0=10)) == "answer for c_A0=20, c_B0=10"
+
+
+def test_reordered_quantities_share_parameters():
+    first = "A 1.2 m³ PFR at 350 K and 1 atm is fed A and B at equal concentrations of 10 mol/m^3. Find X."
+    second = "At 1 atm and 350 K, a PFR of 1.20 m^3 is fed A at 10 mol/m^3 and B at 10 mol/m^3. Find X."
+    assert normalize_question(first)[1] == normalize_question(second)[1]
+
+
+@pytest.mark.parametrize("backend", [HashingBackend, HashedEmbeddingBackend])
+@pytest.mark.parametrize("change", [
+    ("gas phase", "liquid phase"),
+    ("The elementary", "The non-elementary"),
+    ("carried out in", "carried out adiabatically in"),
+])
+def test_a_different_problem_statement_misses(backend, change):
+    cache = ResponseCache(backend())
+    question = QUESTION.format(c_A0=10, c_B0=20)
+    cache.put(question, "gas phase answer")
+    assert cache.get(question.replace(*change)) is None
+
+
+def test_a_reworded_request_hits():
+    cache = ResponseCache(HashedEmbeddingBackend())
+    question = QUESTION.format(c_A0=10, c_B0=20)
+    cache.put(question, "answer")
+    assert cache.get(question.replace("What is the conversion", "Calculate the conversion")) == "answer"
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+
+import pytest
+
+from server import result_cache
+from server.result_cache import HEADER, KEY_LEN, PROBE_LIMIT, SEQ, SharedResultCache
+
+
+def key(i):
+    return (float(i),) + (1.0,) * (KEY_LEN - 1)
+
+
+def value(i):
+    return (i / 7, i * 3.0)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "results")
+
+
+def test_round_trip(path):
+    cache = SharedResultCache(path, slots=64)
+    assert cache.get(key(1)) is None
+    cache.put(key(1), value(1))
+    assert cache.get(key(1)) == value(1)
+    cache.put(key(1), value(2))
+    assert cache.get(key(1)) == value(2)
+
+
+def test_full_probe_sequence_evicts_the_oldest(path, monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(result_cache.time, "time", lambda: float(next(clock)))
+    # With as many slots as probes, every key probes every slot
+    cache = SharedResultCache(path, slots=PROBE_LIMIT)
+    for i in range(PROBE_LIMIT + 1):
+        cache.put(key(i), value(i))
+    assert cache.get(key(0)) is None
+    assert all(cache.get(key(i)) == value(i) for i in range(1, PROBE_LIMIT + 1))
+
+
+def test_slot_being_written_is_skipped(path):
+    cache = SharedResultCache(path, slots=64)
+    cache.put(key(1), value(1))
+    offset = next(o for o in cache._probe(result_cache._hash(result_cache.normalize_key(key(1))))
+                  if SEQ.unpack_from(cache._map, o)[0])
+    seq = SEQ.unpack_from(cache._map, offset)[0]
+    SEQ.pack_into(cache._map, offset, seq + 1)
+    assert cache.get(key(1)) is None
+    SEQ.pack_into(cache._map, offset, seq + 2)
+    assert cache.get(key(1)) == value(1)
+
+
+def test_other_version_or_shape_gets_a_new_file(path):
+    old = SharedResultCache(path, slots=64, version=1)
+    old.put(key(1), value(1))
+
+    new = SharedResultCache(path, slots=64, version=2)
+    assert new.get(key(1)) is None
+    resized = SharedResultCache(path, slots=32, version=2)
+    assert resized.get(key(1)) is None
+    # The old mapping is left intact rather than truncated under its reader
+    assert old.get(key(1)) == value(1)
+    assert os.path.getsize(path) == HEADER.size + 32 * result_cache.SLOT.size
+
+
+def _write(path, start, count):
+    cache = SharedResultCache(path, slots=4096)
+    for i in range(start, start + count):
+        cache.put(key(i), value(i))
+
+
+def test_concurrent_writers_never_expose_torn_slots(path):
+    reader = SharedResultCache(path, slots=4096)
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_write, args=(path, n * 500, 500)) for n in range(4)]
+    for writer in writers:
+        writer.start()
+    while any(writer.is_alive() for writer in writers):
+        for i in range(0, 2000, 7):
+            found = reader.get(key(i))
+            assert found is None or found == value(i)
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    assert sum(reader.get(key(i)) == value(i) for i in range(2000)) > 1900
+
+
+def test_probe_starts_use_every_slot_parity():
+    starts = {result_cache._hash(key(i)) % 64 for i in range(1000)}
+    assert {start % 2 for start in starts} == {0, 1}
+    assert len(starts) == 64
+
+
+def test_hosts_without_fcntl_fall_back_to_a_local_cache(monkeypatch):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def no_fcntl(name, *args, **kwargs):
+        if name == "fcntl":
+            raise ImportError("No module named 'fcntl'")
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_fcntl)
+    monkeypatch.setattr(result_cache, "RESULT_CACHE", "shared")
+    assert isinstance(result_cache.result_cache_from_env(), result_cache.LocalResultCache)
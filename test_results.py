@@ -0,0 +1,45 @@
+import math
+
+import pytest
+
+from reactors.pfr.results import FIELDS, PFRBatchResult, PFRResult
+
+RESULTS = [
+    PFRResult(0.01, 350, 1, 10, 10, 0.0302, reactor_volume=1.2, conversion=0.985),
+    PFRResult(0.01, 350, 1, 10, 10, 0.0302, production=0.09, reactor_volume=0.185),
+    PFRResult(0.01, 350, 1, 10, 10, 0.0302, reactor_volume=-1).did_not_converge("negative volume"),
+]
+
+
+@pytest.mark.parametrize("result", RESULTS)
+def test_result_round_trips_through_a_dict(result):
+    assert PFRResult.from_dict(result.to_dict()) == result
+
+
+def test_failed_result_serializes_its_reason():
+    data = RESULTS[2].to_dict()
+    assert data["converged"] is False
+    assert data["reason"] == "negative volume"
+    assert "conversion" not in data
+
+
+def test_batch_records_and_columns_agree():
+    batch = PFRBatchResult.from_results(RESULTS)
+    records = batch.to_records()
+    assert records == [result.to_dict() for result in RESULTS]
+    assert [PFRResult.from_dict(record) for record in records] == RESULTS
+
+    columns = batch.to_columns()
+    assert columns["converged"] == [True, True, False]
+    assert columns["reason"] == [None, None, "negative volume"]
+    for i, record in enumerate(records):
+        for field in FIELDS:
+            assert columns[field][i] == record.get(field)
+
+
+def test_batch_rows_can_be_replaced():
+    batch = PFRBatchResult.from_results(RESULTS)
+    batch[2] = RESULTS[0]
+    assert batch[2] == RESULTS[0]
+    assert batch.to_columns()["reason"][2] is None
+    assert math.isnan(batch.columns["production"][0])
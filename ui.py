@@ -1,11 +1,61 @@
+import asyncio
+import queue
+import threading
+import uuid
+
 import streamlit as st
 from langserve import RemoteRunnable
 
-remote_chain = RemoteRunnable("http://localhost:8000")
+
+@st.cache_resource
+def get_remote_chain():
+    """
+    One client for every rerun and every browser session.
+
+    The /chat route keeps the conversation on the server, so only the new message and
+    the session id are sent with each request. The client's async connection pool is
+    tied to the event loop that first uses it, so it gets a loop of its own on a
+    background thread and keep-alive connections survive between reruns.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="remote-chain", daemon=True).start()
+    return loop, RemoteRunnable("http://localhost:8000/chat/")
+
+
+def stream_events(payload, config):
+    """Yield agent events from /stream_events as they arrive."""
+    loop, remote_chain = get_remote_chain()
+    events = queue.Queue()
+
+    async def pump():
+        try:
+            # The history summarizer is tagged so that its output is not shown as the answer
+            async for event in remote_chain.astream_events(
+                payload, config=config, version="v1", exclude_tags=["history_summary"]
+            ):
+                events.put(event)
+        except Exception as exc:
+            events.put(exc)
+        finally:
+            events.put(None)
+
+    asyncio.run_coroutine_threadsafe(pump(), loop)
+    while (event := events.get()) is not None:
+        if isinstance(event, Exception):
+            raise event
+        yield event
+
+
+def _content(chunk):
+    return chunk.get("content", "") if isinstance(chunk, dict) else chunk.content
+
 
 st.title("AI Reactor Engineer")
 
-# Initialize chat history in the session state if it doesn't exist
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+
+# The local copy of the chat history is only used to redraw the page
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
     with st.chat_message("assistant"):
@@ -26,19 +76,38 @@ if user_input:  # Proceed if the user has entered something
     with st.chat_message("user"):
         st.markdown(user_input)
 
-    # Call the remote AI engine
-    response = remote_chain.invoke({
-        "input": user_input,
-        # Use the last 10 messages from the chat history
-        "chat_history": st.session_state.chat_history[-10:]
-    })
-
-    # Extract the AI's response from the output
-    ai_response = response['output']
-
-    # Display AI message in the chat
+    # Render the answer token by token, and the solver calls as they start and finish
     with st.chat_message("ai"):
-        st.markdown(ai_response)
+        tool_status = None
+        final_output = None
+        answer = st.empty()
+        ai_response = ""
+        for event in stream_events(
+            {"input": user_input},
+            config={"configurable": {"session_id": st.session_state.session_id}},
+        ):
+            kind = event["event"]
+            if kind == "on_chat_model_start":
+                # Only the last model call of the agent loop produces the answer
+                ai_response = ""
+            elif kind == "on_chat_model_stream":
+                ai_response += _content(event["data"]["chunk"])
+                answer.markdown(ai_response + "▌")
+            elif kind == "on_tool_start":
+                if tool_status is None:
+                    tool_status = st.status("Running calculations...")
+                tool_status.write(f"`{event['name']}` {event['data'].get('input')}")
+            elif kind == "on_tool_end":
+                tool_status.write(f"Result: {event['data'].get('output')}")
+            elif kind == "on_chain_end":
+                # The last chain to end is the agent run itself
+                final_output = event["data"].get("output")
+        if not ai_response and isinstance(final_output, dict):
+            # Answers that were not streamed by the model
+            ai_response = final_output.get("output", "")
+        if tool_status is not None:
+            tool_status.update(label="Calculations complete", state="complete")
+        answer.markdown(ai_response)
 
     # Add AI message to chat history
     st.session_state.chat_history.append({"content": ai_response, "role": "ai"})